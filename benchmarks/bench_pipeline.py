@@ -0,0 +1,206 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+#path para importar os módulos do src
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from alerts import Alert
+from dataset import Dataset
+from features import build_features
+from predictor import Predictor
+from storage import csv_to_store, read_table
+
+
+# Escalas padrão: municípios × anos (8 = tabela atual, 853 = MG, 5570 = Brasil)
+DEFAULT_SCALES: list[str] = ["8x10", "100x10", "853x15", "5570x25"]
+
+# Prefixos de UF usados para gerar códigos IBGE sintéticos (MG primeiro)
+UF_PREFIXES: list[int] = [31, 35, 33, 29, 41, 43, 26, 23, 52, 15, 21, 42, 25, 24, 22, 27, 50, 51, 32, 28,
+                          11, 17, 13, 12, 16, 14, 53]
+
+
+def make_synthetic_table(n_cities: int, n_years: int, last_year: int = 2025, seed: int = 42) -> pd.DataFrame:
+    """Tabela mestre sintética no esquema atual, com sazonalidade de casos e clima"""
+    rng = np.random.default_rng(seed)
+    years = np.arange(last_year - n_years + 1, last_year + 1)
+    months = np.arange(1, 13)
+
+    # Códigos de 7 dígitos: prefixo da UF + sequencial (até 99999 municípios por UF)
+    city_idx = np.arange(n_cities)
+    codes = np.array([UF_PREFIXES[i % len(UF_PREFIXES)] for i in city_idx]) * 100000 + city_idx // len(UF_PREFIXES) * 10 + 1
+
+    n_periods = len(years) * 12
+    code_col = np.repeat(codes, n_periods)
+    year_col = np.tile(np.repeat(years, 12), n_cities)
+    month_col = np.tile(np.tile(months, len(years)), n_cities)
+
+    population = np.repeat(rng.lognormal(mean=9.5, sigma=1.2, size=n_cities).astype(np.int64) + 1000, n_periods)
+    season = np.cos(2 * np.pi * (month_col - 2) / 12)  # pico em fevereiro
+    rainfall = np.clip(120 + 110 * season + rng.normal(0, 40, len(code_col)), 0, None)
+    temperature = 22 + 3 * season + rng.normal(0, 1, len(code_col))
+    humidity = np.clip(68 + 10 * season + rng.normal(0, 5, len(code_col)), 20, 100)
+    incidence = np.exp(1.5 + 1.2 * season + rng.normal(0, 0.6, len(code_col)))  # casos por 100 mil
+    cases = rng.poisson(incidence * population / 100000)
+
+    return pd.DataFrame({
+        "id": np.arange(1, len(code_col) + 1),
+        "year": year_col,
+        "month": month_col,
+        "municipality_code_ibge": code_col,
+        "municipality_name": [f"Municipio {code}" for code in code_col],
+        "dengue_cases": cases,
+        "estimated_population": population,
+        "rainfall_mm": rainfall.round(1),
+        "average_temperature": temperature.round(1),
+        "average_humidity": humidity.round(1),
+    })
+
+
+def _measure(fn: Callable[[], object], repeat: int, items: int = 1) -> dict:
+    """Latência (ms) e vazão de fn, e pico de memória de uma execução extra sob tracemalloc"""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = np.array(latencies)
+    total_seconds = latencies.sum() / 1000
+    return {
+        "repeat": repeat,
+        "items_per_call": items,
+        "mean_ms": float(latencies.mean()),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "throughput_per_s": float(repeat * items / total_seconds) if total_seconds > 0 else None,
+        "peak_memory_mb": peak / 2**20,
+    }
+
+
+def run_scale(n_cities: int, n_years: int, repeat: int, train_sample: int, workdir: str) -> dict:
+    table = make_synthetic_table(n_cities, n_years)
+    csv_path = os.path.join(workdir, f"master_{n_cities}x{n_years}.csv")
+    table.to_csv(csv_path, sep=";", index=False, encoding="utf-8-sig")
+    store_path = csv_to_store(csv_path)
+    model_dir = os.path.join(workdir, f"models_{n_cities}x{n_years}")
+
+    codes = [str(code) for code in table["municipality_code_ibge"].unique()]
+    rng = np.random.default_rng(0)
+    sample = [str(code) for code in rng.choice(codes, size=min(train_sample, len(codes)), replace=False)]
+    results: dict[str, dict] = {}
+
+    # Caminho de dados do dashboard (load_data -> read_table) e carga a frio do Dataset
+    results["dashboard_load_data_csv"] = _measure(lambda: read_table(csv_path), max(1, repeat // 5))
+    results["dashboard_load_data_store"] = _measure(lambda: read_table(store_path), max(1, repeat // 5))
+    results["dataset_cold_load_csv"] = _measure(lambda: Dataset(csv_path).refresh(), max(1, repeat // 5))
+
+    predictor = Predictor(csv_path, model_dir=model_dir)
+    predictor.dataset.refresh()
+
+    # _load_data: fatia de um município (tabela já carregada)
+    results["load_data"] = _measure(lambda: [predictor._load_data(code) for code in sample], repeat, len(sample))
+
+    # Features: por município e de todos os municípios em uma passada
+    city_frames = [predictor._load_data(code) for code in sample]
+    results["create_features_city"] = _measure(
+        lambda: [predictor._create_features(df) for df in city_frames], repeat, len(sample))
+    all_rows = predictor.dataset.table[predictor.dataset.table["year"] >= 2020]
+    results["create_features_all"] = _measure(lambda: build_features(all_rows), max(1, repeat // 5), len(all_rows))
+
+    # Treino (sem cache) de uma amostra de municípios
+    feature_frames = [predictor.dataset.city_features(code) for code in sample]
+    results["train"] = _measure(
+        lambda: [predictor._train_model(df) for df in feature_frames], 1, len(sample))
+
+    # Previsões com o modelo já em cache: um mês e horizonte de 14 meses
+    for code in sample:
+        predictor.predict_outbreak(code, "2025", "11")
+    results["predict_single"] = _measure(
+        lambda: [predictor.predict_outbreak(code, "2025", "11") for code in sample], repeat, len(sample))
+    results["predict_batch_14"] = _measure(
+        lambda: [predictor.predict_horizon(code, (2025, 11), 14) for code in sample], repeat, len(sample) * 14)
+
+    # Geração do XML CAP
+    alerts = [Alert(severity="Minor", certainly="Likely", year="2025", month="11", predicted_cases=str(i),
+                    city_name=f"Municipio {code}", city_code=code) for i, code in enumerate(codes[:1000])]
+    results["alert_get_metadata"] = _measure(lambda: [alert.get_metadata() for alert in alerts], repeat, len(alerts))
+
+    shutil.rmtree(model_dir, ignore_errors=True)
+    return {
+        "municipalities": n_cities,
+        "years": n_years,
+        "rows": len(table),
+        "train_sample": len(sample),
+        "benchmarks": results,
+    }
+
+
+def compare(current: dict, baseline: dict) -> None:
+    """Imprime a razão atual/base da latência média de cada benchmark"""
+    for scale, result in current["scales"].items():
+        base = baseline.get("scales", {}).get(scale)
+        if base is None:
+            continue
+        print(f"\n{scale} (atual / base, < 1.00 = mais rápido)")
+        for name, stats in result["benchmarks"].items():
+            base_stats = base["benchmarks"].get(name)
+            if base_stats and base_stats["mean_ms"] > 0:
+                print(f"  {name:<28} {stats['mean_ms'] / base_stats['mean_ms']:6.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks do preditor, do caminho de dados do dashboard e dos alertas")
+    parser.add_argument("--scales", nargs="+", default=DEFAULT_SCALES, help="Escalas no formato MUNICIPIOSxANOS")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--train-sample", type=int, default=5, help="Municípios usados nos benchmarks por município")
+    parser.add_argument("--output", default=os.path.join(os.path.dirname(__file__), 'results',
+                                                         f"bench_{datetime.now().strftime('%Y%m%dT%H%M%S')}.json"))
+    parser.add_argument("--compare", default=None, help="JSON de uma execução anterior para comparação")
+    args = parser.parse_args()
+
+    report = {
+        "created_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "scales": {},
+    }
+
+    workdir = tempfile.mkdtemp(prefix="arbo_bench_")
+    try:
+        for scale in args.scales:
+            n_cities, n_years = (int(value) for value in scale.lower().split("x"))
+            print(f"Executando {scale}...", flush=True)
+            report["scales"][scale] = run_scale(n_cities, n_years, args.repeat, args.train_sample, workdir)
+            for name, stats in report["scales"][scale]["benchmarks"].items():
+                print(f"  {name:<28} p50={stats['p50_ms']:9.2f} ms  p95={stats['p95_ms']:9.2f} ms  "
+                      f"pico={stats['peak_memory_mb']:8.1f} MB")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResultados salvos em {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
@@ -1,76 +1,234 @@
+from contextvars import ContextVar
+from dataclasses import dataclass
 from datetime import datetime, timezone
+from typing import ClassVar, Iterable, TextIO
+from xml.sax.saxutils import escape
+import csv
+import json
+import os
+import re
 
 
+# Campos exportados para JSON Lines e CSV (na ordem das colunas)
+EXPORT_FIELDS: tuple[str, ...] = (
+    "identifier", "sent", "event", "urgency", "severity", "certainly", "year", "month",
+    "predicted_cases", "cases_low", "cases_high", "exceedance_probability", "accuracy",
+    "city_name", "city_code", "headline", "description",
+)
+
+# Carimbo de tempo compartilhado pelos alertas da execução atual (ver AlertBatch)
+_BATCH_SENT: ContextVar[str | None] = ContextVar("alert_batch_sent", default=None)
+
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def cap_certainty(probability: float) -> str:
+    """Converte a probabilidade do evento no vocabulário de <certainty> do CAP v1.2"""
+    if probability > 0.5:
+        return "Likely"
+    if probability >= 0.05:
+        return "Possible"
+    return "Unlikely"
+
+
+def batch_sent() -> str:
+    """Carimbo 'sent' do lote ativo, ou o horário atual (uma única leitura do relógio)"""
+    return _BATCH_SENT.get() or _utc_now()
+
+
+class AlertBatch:
+    """Um único carimbo de tempo para todos os alertas criados dentro do bloco `with`"""
+
+    def __init__(self, sent: str | None = None) -> None:
+        self.sent = sent or _utc_now()
+        self._token = None
+
+    def start(self) -> "AlertBatch":
+        self._token = _BATCH_SENT.set(self.sent)
+        return self
+
+    def __enter__(self) -> "AlertBatch":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        _BATCH_SENT.reset(self._token)
+
+
+@dataclass(slots=True)
 class Alert:
-    def __init__(self, event: str = "Dengue", severity: str = "", certainly: str = "", year: str = "",
-                 month: str = "", predicted_cases: str = "", city_name: str = "", city_code: str = ""):
-        self.identifier = f"alert_{city_code}_{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}"
-        self.sender = "Sistema de Alertas de Saúde Pública"
-        self.sent = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
-        self.status = "Atual"
-        self.msgType = "Alerta"
-        self.scope = "Público"
-        self.language = "pt-BR"
-        self.category = "Arboviroses"
-        self.event = event
-        self.urgency = "None"
-        self.severity = severity
-        self.certainly = certainly
-        self.headline = "Alerta de Surto Arboviral"
-        self.description = "Indicação de potencial surto na região especificada."
-        self.year = year
-        self.month = month
-        self.predicted_cases = predicted_cases
-        self.city_name = city_name
-        self.city_code = city_code
-        self.version = "\"1.0\" encoding=\"UTF-8\""
-        self.namespace = "\"https://docs.oasis-open.org/emergency/cap/v1.2/CAP-v1.2-os.html\""
+    event: str = "Dengue"
+    severity: str = ""
+    certainly: str = ""
+    year: str = ""
+    month: str = ""
+    predicted_cases: int | str = ""
+    city_name: str = ""
+    city_code: str = ""
+    # Previsões são para meses futuros: <urgency> "Future" no vocabulário do CAP v1.2
+    urgency: str = "Future"
+    headline: str = "Alerta de Surto Arboviral"
+    description: str = "Indicação de potencial surto na região especificada."
+    sent: str = ""
+    identifier: str = ""
+    # Incerteza da previsão: P(casos > limiar de severidade alta) e intervalo de 80%
+    exceedance_probability: float | None = None
+    cases_low: int | None = None
+    cases_high: int | None = None
+    accuracy: str = ""
+
+    # Valores fixos do envelope CAP (compartilhados, não ocupam espaço por instância).
+    # status, msgType, scope e category usam os valores enumerados do CAP v1.2 (em inglês),
+    # para que o documento valide no esquema; o texto legível fica em headline/description
+    sender: ClassVar[str] = "Sistema de Alertas de Saúde Pública"
+    status: ClassVar[str] = "Actual"
+    msgType: ClassVar[str] = "Alert"
+    scope: ClassVar[str] = "Public"
+    language: ClassVar[str] = "pt-BR"
+    category: ClassVar[str] = "Health"
+    version: ClassVar[str] = "\"1.0\" encoding=\"UTF-8\""
+    namespace: ClassVar[str] = "\"urn:oasis:names:tc:emergency:cap:1.2\""
+
+    def __post_init__(self) -> None:
+        if not self.sent:
+            self.sent = batch_sent()
+        if not self.identifier:
+            # Determinístico e único por (município, evento, mês alvo, envio): dois alertas do
+            # mesmo município no mesmo segundo só colidem se forem o mesmo alerta
+            stamp = self.sent.replace("-", "").replace(":", "").rstrip("Z")
+            self.identifier = (f"alert_{self.city_code}_{_slug(self.event)}_"
+                               f"{self.year}{str(self.month).zfill(2)}_{stamp}")
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in EXPORT_FIELDS}
 
     def __str__(self):
         return self.get_metadata()
 
     def get_metadata(self) -> str:
+        return f"<?xml version={self.version}?>\n{self.to_xml_element()}"
+
+    def to_xml_element(self) -> str:
+        """Elemento <alert> (sem a declaração XML), com todos os valores escapados"""
+        e = _xml_text
         result: str = (
-        f"<?xml version={self.version}?>\n"
         f"<alert xmlns={self.namespace}>\n"
-        f"    <identifier>{self.identifier}</identifier>\n"
-        f"    <sender>{self.sender}</sender>\n"
-        f"    <sent>{self.sent}</sent>\n"
-        f"    <status>{self.status}</status>\n"
-        f"    <msgType>{self.msgType}</msgType>\n"
-        f"    <scope>{self.scope}</scope>\n"
+        f"    <identifier>{e(self.identifier)}</identifier>\n"
+        f"    <sender>{e(self.sender)}</sender>\n"
+        f"    <sent>{e(self.sent)}</sent>\n"
+        f"    <status>{e(self.status)}</status>\n"
+        f"    <msgType>{e(self.msgType)}</msgType>\n"
+        f"    <scope>{e(self.scope)}</scope>\n"
         f"    <info>\n"
-        f"        <language>{self.language}</language>\n"
-        f"        <category>{self.category}</category>\n"
-        f"        <event>{self.event}</event>\n"
-        f"        <urgency>{self.urgency}</urgency>\n"
-        f"        <severity>{self.severity}</severity>\n"
-        f"        <certainty>{self.certainly}</certainty>\n"
-        f"        <headline>{self.headline}</headline>\n"
-        f"        <description>{self.description}</description>\n"
+        f"        <language>{e(self.language)}</language>\n"
+        f"        <category>{e(self.category)}</category>\n"
+        f"        <event>{e(self.event)}</event>\n"
+        f"        <urgency>{e(self.urgency)}</urgency>\n"
+        f"        <severity>{e(self.severity)}</severity>\n"
+        f"        <certainty>{e(self.certainly)}</certainty>\n"
+        f"        <headline>{e(self.headline)}</headline>\n"
+        f"        <description>{e(self.description)}</description>\n"
         f"        <parameter>\n"
         f"            <valueName>year</valueName>\n"
-        f"            <value>{self.year}</value>\n"
+        f"            <value>{e(self.year)}</value>\n"
         f"        </parameter>\n"
         f"        <parameter>\n"
         f"            <valueName>month</valueName>\n"
-        f"            <value>{self.month}</value>\n"
+        f"            <value>{e(self.month)}</value>\n"
         f"        </parameter>\n"
         f"        <parameter>\n"
         f"            <valueName>predictedCases</valueName>\n"
-        f"            <value>{self.predicted_cases}</value>\n"
+        f"            <value>{e(self.predicted_cases)}</value>\n"
         f"        </parameter>\n"
+        f"{self._uncertainty_parameters()}"
         f"        <area>\n"
-        f"            <areaDesc>{self.city_name}</areaDesc>\n"
+        f"            <areaDesc>{e(self.city_name)}</areaDesc>\n"
         f"            <geocode>\n"
         f"                <valueName>IBGE</valueName>\n"
-        f"                <value>{self.city_code}</value>\n"
+        f"                <value>{e(self.city_code)}</value>\n"
         f"            </geocode>\n"
         f"        </area>\n"
         f"    </info>\n"
         f"</alert>")
         return result
 
+    def _uncertainty_parameters(self) -> str:
+        values = [
+            ("predictedCasesLow", self.cases_low),
+            ("predictedCasesHigh", self.cases_high),
+            ("exceedanceProbability", self.exceedance_probability),
+            ("modelAccuracy", self.accuracy or None),
+        ]
+        return "".join(
+            f"        <parameter>\n"
+            f"            <valueName>{name}</valueName>\n"
+            f"            <value>{_xml_text(value)}</value>\n"
+            f"        </parameter>\n"
+            for name, value in values if value is not None
+        )
+
+
+def _xml_text(value: object) -> str:
+    # Escapa &, < e > (nomes de municípios, descrições etc. podem conter esses caracteres)
+    return escape(str(value))
+
+
+def _slug(value: str) -> str:
+    return re.sub(r"[^0-9a-z]+", "-", value.lower()).strip("-")
+
+
+def _cap_filename(alert: Alert) -> str:
+    return re.sub(r"[^0-9A-Za-z_.-]", "_", alert.identifier) + ".xml"
+
+
+def write_cap_files(alerts: Iterable[Alert], directory: str) -> int:
+    """Grava um documento CAP por alerta, à medida que os alertas chegam. Retorna a quantidade."""
+    os.makedirs(directory, exist_ok=True)
+    count = 0
+    for alert in alerts:
+        with open(os.path.join(directory, _cap_filename(alert)), "w", encoding="utf-8") as f:
+            f.write(alert.get_metadata())
+            f.write("\n")
+        count += 1
+    return count
+
+
+def write_cap_feed(alerts: Iterable[Alert], out: TextIO) -> int:
+    """Escreve os alertas como um único documento XML (<alerts> com vários <alert>), em streaming.
+
+    Cada alerta é escrito assim que é produzido, sem manter os documentos em memória.
+    """
+    out.write('<?xml version="1.0" encoding="UTF-8"?>\n<alerts>\n')
+    count = 0
+    for alert in alerts:
+        out.write(alert.to_xml_element())
+        out.write("\n")
+        count += 1
+    out.write("</alerts>\n")
+    return count
+
+
+def write_alerts_jsonl(alerts: Iterable[Alert], out: TextIO) -> int:
+    """Um objeto JSON por linha, em streaming"""
+    count = 0
+    for alert in alerts:
+        out.write(json.dumps(alert.to_dict(), ensure_ascii=False))
+        out.write("\n")
+        count += 1
+    return count
+
+
+def write_alerts_csv(alerts: Iterable[Alert], out: TextIO) -> int:
+    """CSV com separador ';' (mesmo padrão das tabelas do projeto), em streaming"""
+    writer = csv.writer(out, delimiter=";", lineterminator="\n")
+    writer.writerow(EXPORT_FIELDS)
+    count = 0
+    for alert in alerts:
+        writer.writerow([getattr(alert, name) for name in EXPORT_FIELDS])
+        count += 1
+    return count
+
 
 if __name__ == "__main__":
     A = Alert(
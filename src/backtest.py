@@ -0,0 +1,191 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, r2_score
+
+from dataset import get_dataset
+from features import DEFAULT_DISEASE, DISEASES, disease_view
+from forecast_engine import limit_worker_threads, pool_size
+from model_registry import ModelRegistry
+from predictor import FEATURE_COLS, IBGE_CITY_CODES, RF_PARAMS, Predictor
+
+
+# Ano mínimo da tabela carregada para o treino: todo o histórico, não só os anos avaliados
+HISTORY_MIN_YEAR = 0
+
+
+@dataclass
+class BacktestResult:
+    predictions: pd.DataFrame
+    per_city: pd.DataFrame
+    overall: dict
+
+
+def _severity(cases: np.ndarray, p65: np.ndarray, p80: np.ndarray) -> np.ndarray:
+    # Mesma classificação adaptativa do Predictor
+    return np.select([cases > p80, cases > p65], ["Severe", "Moderate"], default="Minor")
+
+
+def backtest_city(df: pd.DataFrame, city_code: str, params: dict, min_train: int = 24,
+                  trees_per_origin: int = 25, incremental: bool = True, n_jobs: int = -1,
+                  start_year: int = 2020) -> pd.DataFrame:
+    """Avaliação walk-forward de um município: uma origem por mês, prevendo o mês seguinte.
+
+    df traz todo o histórico do município; são avaliados os meses alvo a partir de janeiro de
+    start_year (os anos anteriores só entram no treino), desde que haja min_train meses antes.
+    No modo incremental, a floresta é mantida entre origens (warm_start): a cada origem,
+    trees_per_origin árvores novas são treinadas com os dados disponíveis até ela e as mais
+    antigas são descartadas, mantendo o tamanho da floresta. O StandardScaler não é usado:
+    árvores de decisão não dependem da escala das features.
+    """
+    # Mesmo critério do Predictor: colunas de outras doenças não descartam linhas
+    df = df.dropna(subset=FEATURE_COLS + ["target"])
+    X = df[FEATURE_COLS].to_numpy(dtype=np.float32)
+    y = df["target"].to_numpy(dtype=np.float64)
+    cases = df["dengue_cases"].to_numpy(dtype=np.float64)
+    n_estimators = params["n_estimators"]
+
+    # Primeira origem cujo mês alvo (o seguinte ao da linha) é de start_year em diante
+    target_periods = df["year"].to_numpy(dtype=np.int64) * 12 + df["month"].to_numpy(dtype=np.int64)
+    first_origin = max(min_train, int(np.searchsorted(target_periods, start_year * 12, side="left")))
+
+    rows = []
+    model = None
+    for origin in range(first_origin, len(df)):
+        if incremental and model is not None:
+            # Aposenta as árvores mais antigas e treina novas com os dados mais recentes
+            keep = max(0, n_estimators - trees_per_origin)
+            model.estimators_ = model.estimators_[len(model.estimators_) - keep:]
+            model.set_params(n_estimators=keep + trees_per_origin)
+        else:
+            model = RandomForestRegressor(**params, n_jobs=n_jobs, warm_start=incremental)
+        model.fit(X[:origin], y[:origin])
+
+        predicted = max(0.0, float(model.predict(X[origin:origin + 1])[0]))
+        # Limiares de severidade com o histórico conhecido na origem
+        p65, p80 = np.quantile(cases[:origin + 1], [0.65, 0.80])
+        rows.append((origin, predicted, p65, p80))
+
+    if not rows:
+        return pd.DataFrame()
+
+    origins, predicted, p65, p80 = (np.array(values) for values in zip(*rows))
+    actual = y[origins]
+    # O alvo é o mês seguinte ao da linha de origem
+    years = df["year"].to_numpy(dtype=np.int64)[origins]
+    months = df["month"].to_numpy(dtype=np.int64)[origins]
+    return pd.DataFrame({
+        "municipality_code_ibge": city_code,
+        "target_year": years + (months == 12),
+        "target_month": months % 12 + 1,
+        "actual": actual,
+        "predicted": predicted,
+        "actual_severity": _severity(actual, p65, p80),
+        "predicted_severity": _severity(predicted, p65, p80),
+    })
+
+
+def _summarize(predictions: pd.DataFrame) -> dict:
+    return {
+        "origins": int(len(predictions)),
+        "mae": float(mean_absolute_error(predictions["actual"], predictions["predicted"])),
+        "r2": float(r2_score(predictions["actual"], predictions["predicted"])) if len(predictions) > 1 else float("nan"),
+        "severity_hit_rate": float((predictions["actual_severity"] == predictions["predicted_severity"]).mean()),
+    }
+
+
+# Dataset de cada processo do pool
+_WORKER_TABLEPATH: str | None = None
+
+
+def _init_worker(tablepath: str, threads_per_worker: int) -> None:
+    global _WORKER_TABLEPATH
+    limit_worker_threads(threads_per_worker)
+    _WORKER_TABLEPATH = tablepath
+
+
+def _backtest_worker(city_code: str, params: dict, min_train: int, trees_per_origin: int,
+                     incremental: bool, start_year: int, n_jobs: int, disease: str) -> pd.DataFrame:
+    df = disease_view(get_dataset(_WORKER_TABLEPATH).city_features(city_code, min_year=HISTORY_MIN_YEAR), disease)
+    return backtest_city(df, city_code, params, min_train, trees_per_origin, incremental, n_jobs, start_year)
+
+
+def backtest(tablepath: str, city_codes: list[str] | None = None, params: dict | None = None,
+             min_train: int = 24, trees_per_origin: int = 25, incremental: bool = True,
+             start_year: int = 2020, max_workers: int | None = None, model_dir: str | None = None,
+             disease: str = DEFAULT_DISEASE) -> BacktestResult:
+    """Backtest walk-forward de todos os municípios, com os municípios avaliados em paralelo.
+
+    Cada município usa os mesmos hiperparâmetros do modelo em produção (RF_PARAMS com os
+    ajustados pelo tuning.py para a doença, quando existirem); params sobrepõe os dois.
+    """
+    registry = ModelRegistry(model_dir)
+    if city_codes is None:
+        city_codes = [str(code) for code in get_dataset(tablepath).city_codes]
+
+    max_workers, threads_per_worker = pool_size(len(city_codes), max_workers)
+
+    frames = []
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(tablepath, threads_per_worker)
+    ) as executor:
+        futures = [
+            executor.submit(_backtest_worker, code,
+                            {**RF_PARAMS, **(registry.get_params(Predictor._model_name(code, disease)) or {}),
+                             **(params or {})},
+                            min_train, trees_per_origin, incremental, start_year, threads_per_worker, disease)
+            for code in city_codes
+        ]
+        for future in as_completed(futures):
+            frames.append(future.result())
+
+    predictions = pd.concat([frame for frame in frames if not frame.empty], ignore_index=True)
+    predictions = predictions.sort_values(["municipality_code_ibge", "target_year", "target_month"], ignore_index=True)
+    per_city = pd.DataFrame([
+        {"municipality_code_ibge": code, **_summarize(group)}
+        for code, group in predictions.groupby("municipality_code_ibge")
+    ])
+    return BacktestResult(predictions=predictions, per_city=per_city, overall=_summarize(predictions))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest walk-forward (origem móvel) do modelo")
+    parser.add_argument("--table", default=os.path.join(os.path.dirname(__file__), '..', 'data', 'master_table.csv'))
+    parser.add_argument("--all", action="store_true", help="Todos os municípios da tabela (padrão: IBGE_CITY_CODES)")
+    parser.add_argument("--min-train", type=int, default=24, help="Meses mínimos de treino antes da primeira origem")
+    parser.add_argument("--trees-per-origin", type=int, default=25)
+    parser.add_argument("--full-refit", action="store_true", help="Retreina a floresta inteira em cada origem")
+    parser.add_argument("--start-year", type=int, default=2020, help="Primeiro ano de meses alvo avaliados")
+    parser.add_argument("--disease", choices=list(DISEASES), default=DEFAULT_DISEASE)
+    parser.add_argument("--n-estimators", type=int, default=None,
+                        help="Sobrepõe o valor ajustado (ou o padrão) de todos os municípios")
+    parser.add_argument("--max-depth", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default=None, help="CSV com as previsões de cada origem")
+    args = parser.parse_args()
+
+    result = backtest(
+        args.table,
+        city_codes=None if args.all else list(IBGE_CITY_CODES),
+        params={name: value for name, value in
+                (("n_estimators", args.n_estimators), ("max_depth", args.max_depth)) if value is not None},
+        min_train=args.min_train,
+        trees_per_origin=args.trees_per_origin,
+        incremental=not args.full_refit,
+        start_year=args.start_year,
+        max_workers=args.workers,
+        disease=args.disease,
+    )
+
+    print(result.per_city.to_string(index=False))
+    print(f"\nGeral: {result.overall['origins']} origens | MAE={result.overall['mae']:.1f} casos | "
+          f"R²={result.overall['r2']:.3f} | Acerto de severidade={result.overall['severity_hit_rate']:.1%}")
+    if args.output:
+        result.predictions.to_csv(args.output, sep=";", index=False)
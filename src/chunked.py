@@ -0,0 +1,212 @@
+from dataclasses import dataclass
+from typing import Iterator
+import gc
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from dataset import release_dataset
+from features import DEFAULT_DISEASE
+from forecast_engine import CityForecast
+from predictor import Predictor
+from profiling import peak_rss_bytes, rss_bytes
+from storage import SCHEMA, is_store, normalize_columns, read_store, write_store
+
+
+GROUP_COL = "municipality_code_ibge"
+
+# Estimativa conservadora de memória por linha da tabela ao longo do pipeline
+# (tabela tipada + matriz de features em float64 + cópias temporárias do pandas)
+BYTES_PER_ROW = 1024
+
+# Reserva para a floresta do município em uso e para o pico do treino
+MODEL_RESERVE_BYTES = 256 * 1024 * 1024
+
+# O primeiro bloco usa esta fração do tamanho estimado; a memória medida nele dimensiona os demais
+PROBE_FRACTION = 4
+
+# Linhas lidas por vez ao varrer um CSV
+CSV_CHUNK_ROWS = 200_000
+
+
+@dataclass
+class ChunkStats:
+    """Resumo de uma execução em blocos"""
+    chunks: int = 0
+    cities: int = 0
+    rows: int = 0
+    rows_per_chunk: int = 0
+    peak_rss_bytes: int | None = None
+    memory_limit_bytes: int | None = None
+
+    def summary(self) -> str:
+        peak = f"{self.peak_rss_bytes / 2**20:.0f} MiB" if self.peak_rss_bytes else "n/d"
+        limit = f"{self.memory_limit_bytes / 2**20:.0f} MiB" if self.memory_limit_bytes else "sem limite"
+        return (f"{self.cities} municípios, {self.rows} linhas em {self.chunks} blocos "
+                f"(até {self.rows_per_chunk} linhas) | pico de RSS: {peak} | limite: {limit}")
+
+
+def city_row_counts(tablepath: str) -> pd.Series:
+    """Linhas por município, lendo apenas a coluna do código (memória proporcional a uma coluna)"""
+    if is_store(tablepath):
+        codes = read_store(tablepath, columns=[GROUP_COL])[GROUP_COL]
+        return codes.value_counts(sort=False).sort_index()
+
+    counts = pd.Series(dtype=np.int64)
+    for part in pd.read_csv(tablepath, sep=";", encoding="utf-8-sig", usecols=[GROUP_COL], chunksize=CSV_CHUNK_ROWS):
+        counts = counts.add(part[GROUP_COL].value_counts(), fill_value=0)
+    return counts.astype(np.int64).sort_index()
+
+
+def plan_chunks(row_counts: pd.Series, max_rows: int) -> list[list[int]]:
+    """Agrupa municípios consecutivos em blocos de até max_rows linhas (um município nunca é dividido)"""
+    chunks: list[list[int]] = []
+    current: list[int] = []
+    rows = 0
+    for code, count in row_counts.items():
+        if current and rows + count > max_rows:
+            chunks.append(current)
+            current, rows = [], 0
+        current.append(int(code))
+        rows += int(count)
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def bucket_csv(tablepath: str, chunks: list[list[int]], work_dir: str) -> dict[int, str]:
+    """Distribui as linhas do CSV em um arquivo por bloco, em uma única leitura da tabela.
+
+    Devolve município -> arquivo do seu bloco; cada bloco depois lê só o próprio arquivo
+    em vez de varrer o CSV inteiro de novo.
+    """
+    bucket_of = {code: i for i, chunk in enumerate(chunks) for code in chunk}
+    paths = [os.path.join(work_dir, f"bucket_{i}.csv") for i in range(len(chunks))]
+    for part in pd.read_csv(tablepath, sep=";", encoding="utf-8-sig", chunksize=CSV_CHUNK_ROWS):
+        ids = part[GROUP_COL].map(bucket_of)
+        part, ids = part[ids.notna()], ids[ids.notna()].astype(int)
+        for i, rows in part.groupby(ids):
+            rows.to_csv(paths[i], sep=";", index=False, mode="a", header=not os.path.exists(paths[i]))
+    return {code: paths[i] for code, i in bucket_of.items()}
+
+
+def read_cities(tablepath: str, city_codes: list[int], buckets: dict[int, str] | None = None) -> pd.DataFrame:
+    """Somente as linhas dos municípios informados (de um CSV, lidas dos arquivos de bucket_csv)"""
+    if is_store(tablepath):
+        # Só as linhas desses municípios são lidas do disco (as colunas ficam mapeadas em memória)
+        codes = np.load(os.path.join(tablepath, f"{GROUP_COL}.npy"), mmap_mode="r")
+        rows = np.flatnonzero(np.isin(codes, city_codes))
+        return read_store(tablepath, rows=rows)
+
+    # Depois de uma redução dos blocos, um bloco novo pode abranger mais de um arquivo
+    paths = sorted({buckets[code] for code in city_codes if code in buckets}) if buckets is not None else [tablepath]
+    wanted = set(city_codes)
+    parts = [part[part[GROUP_COL].isin(wanted)]
+             for path in paths
+             for part in pd.read_csv(path, sep=";", encoding="utf-8-sig", chunksize=CSV_CHUNK_ROWS)]
+    return normalize_columns(pd.concat(parts, ignore_index=True)) if parts else pd.DataFrame(columns=list(SCHEMA))
+
+
+def rows_for_limit(memory_limit_bytes: int, bytes_per_row: int = BYTES_PER_ROW) -> int:
+    """Linhas por bloco que cabem no limite, descontando a memória já em uso e a reserva do modelo"""
+    available = memory_limit_bytes - (rss_bytes() or 0) - MODEL_RESERVE_BYTES
+    if available <= 0:
+        raise ValueError(f"Memory limit of {memory_limit_bytes / 2**20:.0f} MiB is below the process baseline")
+    return max(1, available // bytes_per_row)
+
+
+def measured_bytes_per_row(rss_before: int | None, peak_before: int | None, rows: int) -> int:
+    """Memória por linha observada em um bloco: crescimento do pico de RSS além da reserva do modelo.
+
+    Nunca abaixo de BYTES_PER_ROW; sem medição possível (pico anterior maior ou RSS indisponível),
+    fica a estimativa.
+    """
+    peak_after = peak_rss_bytes()
+    if rss_before is None or peak_before is None or peak_after is None or peak_after <= peak_before or not rows:
+        return BYTES_PER_ROW
+    return max(BYTES_PER_ROW, (peak_after - rss_before - MODEL_RESERVE_BYTES) // rows)
+
+
+def forecast_chunked(tablepath: str, start: tuple, n_months: int = 1, memory_limit_mb: int | None = None,
+                     city_codes: list[str] | None = None, model_dir: str | None = None, n_jobs: int = -1,
+                     recursive: bool = False, diseases: tuple[str, ...] = (DEFAULT_DISEASE,),
+                     stats: ChunkStats | None = None) -> Iterator[CityForecast]:
+    """Prevê os municípios em blocos particionados por município: carga → features → treino →
+    previsão → alertas de um bloco por vez, sem carregar a tabela inteira.
+
+    Cada bloco vira uma tabela temporária com o seu próprio Predictor, descartados ao final do
+    bloco; os modelos ficam apenas no disco. Um CSV é lido uma única vez e distribuído em
+    arquivos por bloco (bucket_csv). stats, quando informado, recebe o resumo da execução
+    (inclusive o pico de RSS).
+
+    O limite é de melhor esforço: o primeiro bloco tem 1/PROBE_FRACTION do tamanho estimado
+    com BYTES_PER_ROW, e a memória medida nele dimensiona os blocos seguintes. Se ainda assim
+    o RSS passar do limite, os próximos blocos têm metade do tamanho.
+    """
+    stats = stats if stats is not None else ChunkStats()
+    counts = city_row_counts(tablepath)
+    if city_codes is not None:
+        counts = counts[counts.index.isin([int(code) for code in city_codes])]
+
+    limit = memory_limit_mb * 2**20 if memory_limit_mb else None
+    max_rows = rows_for_limit(limit) if limit else int(counts.sum()) or 1
+    stats.memory_limit_bytes = limit
+    stats.rows_per_chunk = max_rows
+
+    chunks = plan_chunks(counts, max(1, max_rows // PROBE_FRACTION) if limit else max_rows)
+    probing = limit is not None
+    work_dir = tempfile.mkdtemp(prefix="arbo_chunks_")
+    try:
+        buckets = None if is_store(tablepath) else bucket_csv(tablepath, chunks, work_dir)
+        while chunks:
+            chunk = chunks.pop(0)
+            rss_before, peak_before = rss_bytes(), peak_rss_bytes()
+
+            chunk_path = os.path.join(work_dir, f"chunk_{stats.chunks}.npystore")
+            write_store(read_cities(tablepath, chunk, buckets), chunk_path)
+            predictor = Predictor(chunk_path, model_dir=model_dir, n_jobs=n_jobs)
+            for code in chunk:
+                for disease in diseases:
+                    try:
+                        forecast, alerts = predictor.predict_horizon(str(code), start, n_months,
+                                                                     recursive=recursive, disease=disease)
+                        result = CityForecast(str(code), forecast, alerts, disease=disease)
+                    except Exception as e:
+                        result = CityForecast(str(code), error=f"{type(e).__name__}: {e}", disease=disease)
+                    # Só a floresta do município e doença atuais fica em memória
+                    predictor.registry.clear_memory()
+                    predictor.model = predictor.scaler = None
+                    yield result
+
+            stats.chunks += 1
+            stats.cities += len(chunk)
+            stats.rows += int(counts.loc[chunk].sum())
+
+            del predictor
+            release_dataset(chunk_path)
+            shutil.rmtree(chunk_path, ignore_errors=True)
+            gc.collect()
+
+            if probing:
+                # Redimensiona os blocos restantes com a memória por linha medida no primeiro
+                probing = False
+                try:
+                    max_rows = rows_for_limit(limit, measured_bytes_per_row(rss_before, peak_before,
+                                                                             int(counts.loc[chunk].sum())))
+                except ValueError:
+                    # O processo já está no limite: um município por bloco daqui em diante
+                    max_rows = 1
+                stats.rows_per_chunk = max_rows
+                chunks = plan_chunks(counts.loc[[code for rest in chunks for code in rest]], max_rows)
+
+            current = rss_bytes()
+            if limit and current is not None and current > limit and max_rows > 1:
+                max_rows = max(1, max_rows // 2)
+                stats.rows_per_chunk = max_rows
+                chunks = plan_chunks(counts.loc[[code for rest in chunks for code in rest]], max_rows)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        stats.peak_rss_bytes = peak_rss_bytes()
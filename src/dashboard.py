@@ -1,15 +1,12 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
-from datetime import datetime
 import sys
 import os
 
 #path para importar os módulos existentes
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from alerts import Alert
-from predictor import Predictor 
+from dashboard_data import get_forecast, get_forecast_store, load_data, proximo_mes
 
 st.set_page_config(
     page_title="Arboviral Predictor - Dashboard",
@@ -17,20 +14,6 @@ st.set_page_config(
     layout="wide"
 )
 
-#caminho do arquivo de forma global para usar no load_data e no Predictor
-DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'master_table.csv')
-
-# ETL Simples para o Front
-@st.cache_data
-def load_data():
-    try:
-        # O delimitador detectado no arquivo enviado é ';'
-        df = pd.read_csv(DATA_PATH, sep=';') 
-        return df
-    except FileNotFoundError:
-        st.error(f"Arquivo master_table.csv não encontrado em: {DATA_PATH}")
-        return pd.DataFrame()
-
 df = load_data()
 
 # sidebar: Filtros de Recuperação da Informação 
@@ -41,8 +24,8 @@ if not df.empty:
     cidades = df['municipality_name'].unique()
     cidade_selecionada = st.sidebar.selectbox("Selecione o Município:", cidades)
 
-    # Filtrar DF pela cidade
-    df_city = df[df['municipality_name'] == cidade_selecionada].copy()
+    # Filtrar DF pela cidade (somente leitura: sem cópia)
+    df_city = df[df['municipality_name'] == cidade_selecionada]
 
     # Filtro de Ano
     anos = sorted(df_city['year'].unique())
@@ -122,109 +105,52 @@ codigo_ibge = str(df_filtered['municipality_code_ibge'].iloc[0])
 # Preparar datas para previsão (Próximo Mês Real)
 # Nota: O predictor.py lança erro se tentarmos prever datas passadas. 
 # Por isso, calculamos aqui o próximo mês em relação a "hoje" para acionar a IA.
-data_atual = datetime.now()
-ano_prev = data_atual.year
-mes_prev = data_atual.month + 1
-if mes_prev > 12:
-    mes_prev = 1
-    ano_prev += 1
+ano_prev, mes_prev = proximo_mes()
 
 # Variável para armazenar o objeto de alerta gerado
 alerta_gerado = None
 
+# Tradução visual para o Dashboard
+traducao_risco = {
+    "Minor": "Baixo (Monitoramento)",
+    "Moderate": "Médio (Alerta)",
+    "Severe": "Alto Risco (Crítico)"
+}
+
 with col_pred:
-    st.info(f"Previsão via IA (Random Forest)")
-    st.caption(f"Simulando previsão para: **{mes_prev:02d}/{ano_prev}**")
-    
     try:
         
         # integrando com o predictor.py
+        # Previsões dos próximos 2 meses lidas do store pré-calculado; só são calculadas
+        # aqui quando a thread de fundo ainda não chegou a este município
+        codigos = tuple(str(codigo) for codigo in df['municipality_code_ibge'].unique())
+        store = get_forecast_store(ano_prev, mes_prev, codigos)
         with st.spinner("Executando modelo preditivo..."):
-            # Instancia o Predictor com o caminho do CSV
-            modelo = Predictor(tablepath=DATA_PATH)
-            
-            # Chama o método predict_outbreak
-            # Isso treina o modelo em tempo real e retorna o objeto Alert preenchido
-            alerta_gerado = modelo.predict_outbreak(
-                city_code=codigo_ibge, 
-                year=str(ano_prev), 
-                month=str(mes_prev)
+            _, alertas_gerados = get_forecast(
+                codigo_ibge, ano_prev, mes_prev, store.version(codigo_ibge), codigos
             )
 
-        # Definir cor baseada na severidade retornada pelo modelo
-        cor_risco = "green"
-        if alerta_gerado.severity == "Moderate":
-            cor_risco = "orange"
-        elif alerta_gerado.severity == "Severe":
-            cor_risco = "red"
-
-        # Tradução visual para o Dashboard
-        traducao_risco = {
-            "Minor": "Baixo (Monitoramento)",
-            "Moderate": "Médio (Alerta)",
-            "Severe": "Alto Risco (Crítico)"
-        }
-        
-        texto_risco = traducao_risco.get(alerta_gerado.severity, "Desconhecido")
-
-        st.markdown(f"**Risco Calculado:**")
-        st.markdown(f"<h2 style='color:{cor_risco};'>{texto_risco}</h2>", unsafe_allow_html=True)
-        
-        st.metric("Casos Previstos", f"{alerta_gerado.predicted_cases}")
-        st.markdown(f"**Acurácia do Modelo:** {alerta_gerado.certainly}")
-
-    except ValueError as e:
-        # Captura erros do predictor (ex: cidade não mapeada ou data inválida)
-        st.error(f"Erro na Predição: {e}")
-        st.warning("Verifique se a cidade selecionada está no dicionário IBGE_CITY_CODES do predictor.py")
-    except Exception as e:
-        st.error(f"Erro inesperado: {e}")
-
-mes_prev += 1
-if mes_prev > 12:
-    mes_prev = 1
-    ano_prev += 1
+        for alerta_gerado in alertas_gerados:
+            st.info(f"Previsão via IA (Random Forest)")
+            st.caption(f"Simulando previsão para: **{int(alerta_gerado.month):02d}/{alerta_gerado.year}**")
 
-with col_pred:
-    st.info(f"Previsão via IA (Random Forest)")
-    st.caption(f"Simulando previsão para: **{mes_prev:02d}/{ano_prev}**")
-    
-    try:
-        
-        # integrando com o predictor.py
-        with st.spinner("Executando modelo preditivo..."):
-            # Instancia o Predictor com o caminho do CSV
-            modelo = Predictor(tablepath=DATA_PATH)
+            # Definir cor baseada na severidade retornada pelo modelo
+            cor_risco = "green"
+            if alerta_gerado.severity == "Moderate":
+                cor_risco = "orange"
+            elif alerta_gerado.severity == "Severe":
+                cor_risco = "red"
             
-            # Chama o método predict_outbreak
-            # Isso treina o modelo em tempo real e retorna o objeto Alert preenchido
-            alerta_gerado = modelo.predict_outbreak(
-                city_code=codigo_ibge, 
-                year=str(ano_prev), 
-                month=str(mes_prev)
-            )
+            texto_risco = traducao_risco.get(alerta_gerado.severity, "Desconhecido")
 
-        # Definir cor baseada na severidade retornada pelo modelo
-        cor_risco = "green"
-        if alerta_gerado.severity == "Moderate":
-            cor_risco = "orange"
-        elif alerta_gerado.severity == "Severe":
-            cor_risco = "red"
-
-        # Tradução visual para o Dashboard
-        traducao_risco = {
-            "Minor": "Baixo (Monitoramento)",
-            "Moderate": "Médio (Alerta)",
-            "Severe": "Alto Risco (Crítico)"
-        }
-        
-        texto_risco = traducao_risco.get(alerta_gerado.severity, "Desconhecido")
-
-        st.markdown(f"**Risco Calculado:**")
-        st.markdown(f"<h2 style='color:{cor_risco};'>{texto_risco}</h2>", unsafe_allow_html=True)
-        
-        st.metric("Casos Previstos", f"{alerta_gerado.predicted_cases}")
-        st.markdown(f"**Acurácia do Modelo:** {alerta_gerado.certainly}")
+            st.markdown(f"**Risco Calculado:**")
+            st.markdown(f"<h2 style='color:{cor_risco};'>{texto_risco}</h2>", unsafe_allow_html=True)
+            
+            st.metric("Casos Previstos", f"{alerta_gerado.predicted_cases}")
+            st.caption(f"Intervalo de 80%: {alerta_gerado.cases_low} a {alerta_gerado.cases_high} casos")
+            st.markdown(f"**Probabilidade de Risco Alto:** {alerta_gerado.exceedance_probability:.0%} "
+                        f"({alerta_gerado.certainly})")
+            st.markdown(f"**Acurácia do Modelo:** {alerta_gerado.accuracy}")
 
     except ValueError as e:
         # Captura erros do predictor (ex: cidade não mapeada ou data inválida)
@@ -0,0 +1,117 @@
+import json
+import os
+import urllib.request
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+from dataset import get_dataset
+from forecast_store import ForecastStore
+from predictor import Predictor
+from storage import store_is_current
+from summaries import downsample_series, forecast_summary
+
+
+# Dados e caches compartilhados entre as páginas do dashboard (cache_resource/cache_data
+# valem para o processo inteiro do Streamlit, então as páginas usam o mesmo store)
+
+#caminhos dos arquivos de forma global para usar no load_data e no Predictor
+CSV_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'master_table.csv')
+STORE_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'master_table.npystore')
+
+# Malhas municipais do IBGE (GeoJSON por UF), guardadas localmente após o primeiro download
+GEO_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'geo')
+IBGE_MALHAS_URL = ("https://servicodados.ibge.gov.br/api/v3/malhas/estados/{uf}"
+                   "?formato=application/vnd.geo+json&intrarregiao=municipio&qualidade=minima")
+
+# Horizonte exibido no painel de alertas (meses a partir do próximo mês)
+HORIZONTE_MESES = 2
+
+
+def data_path() -> str:
+    # Decidido a cada chamada (o módulo fica carregado enquanto o Streamlit roda): usa o formato
+    # colunar binário quando ele está em dia com o CSV; se o CSV foi atualizado depois da
+    # conversão (ex.: pelo ingest.py), o store está defasado e o CSV é lido
+    return STORE_PATH if store_is_current(STORE_PATH, CSV_PATH) else CSV_PATH
+
+
+def proximo_mes() -> tuple[int, int]:
+    # Próximo mês em relação a "hoje" (o predictor.py não prevê datas passadas)
+    data_atual = datetime.now()
+    ano_prev = data_atual.year
+    mes_prev = data_atual.month + 1
+    if mes_prev > 12:
+        mes_prev = 1
+        ano_prev += 1
+    return ano_prev, mes_prev
+
+
+# ETL Simples para o Front
+# Uma única tabela por processo, a mesma do Predictor (get_dataset), sem a cópia que o cache_data
+# faz a cada execução da página (a tabela é só lida, nunca alterada). refresh() só relê o arquivo
+# quando ele muda, então dados novos aparecem sem reiniciar o Streamlit
+def load_data():
+    caminho = data_path()
+    try:
+        # Lê o formato colunar (sem parsing de texto) ou o CSV com separador ';'
+        dataset = get_dataset(caminho)
+        dataset.refresh()
+        return dataset.table
+    except FileNotFoundError:
+        st.error(f"Arquivo master_table.csv não encontrado em: {caminho}")
+        return pd.DataFrame()
+
+
+@st.cache_resource
+def _forecast_store(ano: int, mes: int, codigos: tuple[str, ...], caminho: str) -> ForecastStore:
+    # Um store por processo do Streamlit (e por tabela); a thread de fundo pré-calcula as
+    # previsões de todos os municípios para que a troca de cidade não dispare treinos
+    store = ForecastStore(Predictor(tablepath=caminho))
+    store.start_background(codigos, (ano, mes), HORIZONTE_MESES)
+    return store
+
+
+def get_forecast_store(ano: int, mes: int, codigos: tuple[str, ...]) -> ForecastStore:
+    # O caminho faz parte da chave: se o store colunar ficar defasado, passa-se a ler o CSV
+    return _forecast_store(ano, mes, codigos, data_path())
+
+
+@st.cache_data(show_spinner=False)
+def get_forecast(codigo_ibge: str, ano: int, mes: int, versao: str, codigos: tuple[str, ...]):
+    # 'versao' (dados + hiperparâmetros do município) faz parte da chave do cache:
+    # novos dados geram uma nova entrada em vez de servir uma previsão antiga
+    store = get_forecast_store(ano, mes, codigos)
+    return store.get_or_compute(codigo_ibge, (ano, mes), HORIZONTE_MESES)
+
+
+@st.cache_data(show_spinner=False)
+def get_summary(ano: int, mes: int, codigos: tuple[str, ...], versao: str, prontos: int) -> pd.DataFrame:
+    # Recalculado só quando os dados mudam ou a thread de fundo grava novas previsões
+    store = get_forecast_store(ano, mes, codigos)
+    return forecast_summary(load_data(), store, (ano, mes), HORIZONTE_MESES)
+
+
+@st.cache_data(show_spinner=False)
+def get_series(periodo: str, por: str, versao: str) -> pd.DataFrame:
+    return downsample_series(load_data(), period=periodo, by=por)
+
+
+@st.cache_data(show_spinner=False)
+def load_geojson(ufs: tuple[int, ...]) -> dict | None:
+    """Malha municipal das UFs informadas (propriedade 'codarea' = código IBGE), ou None offline"""
+    features = []
+    for uf in ufs:
+        path = os.path.join(GEO_DIR, f"{uf}.json")
+        if not os.path.exists(path):
+            try:
+                with urllib.request.urlopen(IBGE_MALHAS_URL.format(uf=uf), timeout=15) as response:
+                    content = response.read()
+            except OSError:
+                return None
+            os.makedirs(GEO_DIR, exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(content)
+        with open(path, encoding="utf-8") as f:
+            features.extend(json.load(f)["features"])
+    return {"type": "FeatureCollection", "features": features}
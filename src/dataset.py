@@ -0,0 +1,209 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from features import build_climatology, build_features
+from storage import SCHEMA_FILE, is_store, read_schema, read_table
+
+
+def _block_bounds(codes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Início e fim de cada bloco contíguo de município (tabela já ordenada)
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=np.int64)
+    ends = np.r_[starts[1:], len(codes)].astype(np.int64)
+    return starts, ends
+
+
+class _FeatureMatrix:
+    """Matriz de features de todos os municípios, com o intervalo de linhas de cada um"""
+
+    def __init__(self, frame: pd.DataFrame, city_versions: dict[int, int]) -> None:
+        self.frame = frame
+        self.city_versions = city_versions
+        codes = frame["municipality_code_ibge"].to_numpy()
+        starts, ends = _block_bounds(codes)
+        self.blocks = {int(codes[s]): (int(s), int(e)) for s, e in zip(starts, ends)}
+
+
+def _content_hash(path: str) -> str:
+    # O formato colunar já guarda a impressão digital do conteúdo no schema.json
+    if is_store(path):
+        return read_schema(path)["fingerprint"]
+
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Dataset:
+    """Tabela mestre carregada uma única vez, com um bloco ordenado no tempo por município.
+
+    Aceita tanto o formato colunar (.npystore) quanto um CSV. A tabela só é relida quando
+    o arquivo muda (mtime/tamanho e, em seguida, hash do conteúdo).
+    """
+
+    def __init__(self, tablepath: str) -> None:
+        self.tablepath = tablepath
+        self.table: pd.DataFrame = pd.DataFrame()
+        self.version: str = ""
+        self._stat: tuple[int, int] | None = None
+        self._blocks: dict[int, tuple[int, int]] = {}
+        # Impressão digital de cada município: só muda para os municípios cujos dados mudaram,
+        # para que caches derivados (features, modelos) invalidem apenas o necessário
+        self._city_versions: dict[int, int] = {}
+        # Matrizes de features por ano mínimo, reaproveitadas entre treino e inferência
+        self._features: dict[int, _FeatureMatrix] = {}
+        # Climatologia por (município, mês), por ano mínimo: (versões dos municípios, tabela)
+        self._climatology: dict[int, tuple[dict[int, int], pd.DataFrame]] = {}
+        self._lock = threading.Lock()
+
+    def _partition(self, df: pd.DataFrame) -> None:
+        # Ordena uma vez por (município, ano, mês) e guarda o intervalo de cada município
+        df = df.sort_values(["municipality_code_ibge", "year", "month"], kind="stable")
+        df = df.reset_index(drop=True)
+        codes = df["municipality_code_ibge"].to_numpy()
+        starts, ends = _block_bounds(codes)
+
+        # Hash por linha, combinado por bloco (ponderado pela posição para depender da ordem)
+        row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        weights = (np.arange(len(df), dtype=np.uint64) - np.repeat(starts, ends - starts).astype(np.uint64)) + np.uint64(1)
+        block_hashes = np.add.reduceat(row_hashes * weights, starts) if len(df) else np.array([], dtype=np.uint64)
+
+        self.table = df
+        self._blocks = {int(codes[s]): (int(s), int(e)) for s, e in zip(starts, ends)}
+        self._city_versions = {int(codes[s]): int(h) for s, h in zip(starts, block_hashes)}
+
+    def _signature(self) -> tuple[int, int]:
+        stat_path = os.path.join(self.tablepath, SCHEMA_FILE) if is_store(self.tablepath) else self.tablepath
+        stat = os.stat(stat_path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def refresh(self) -> bool:
+        """Recarrega a tabela se o arquivo mudou. Retorna True se houve recarga."""
+        with self._lock:
+            signature = self._signature()
+            if signature == self._stat:
+                return False
+
+            content_hash = _content_hash(self.tablepath)
+            if content_hash == self.version:
+                # Arquivo "tocado", mas com o mesmo conteúdo
+                self._stat = signature
+                return False
+
+            # A assinatura só é gravada depois de uma leitura bem-sucedida: se a leitura falhar,
+            # a próxima chamada tenta de novo em vez de seguir com a tabela anterior
+            self._partition(read_table(self.tablepath))
+            self._stat = signature
+            self.version = content_hash
+            return True
+
+    def replace(self, df: pd.DataFrame) -> None:
+        """Adota a tabela recém-gravada por este processo, sem reler nem reparsear o arquivo"""
+        with self._lock:
+            self._partition(df)
+            self._stat = self._signature()
+            self.version = _content_hash(self.tablepath)
+
+    def city_version(self, city_code: str | int) -> int:
+        """Impressão digital dos dados do município (muda apenas quando os dados dele mudam)"""
+        self.refresh()
+        return self._city_versions.get(int(city_code), 0)
+
+    @property
+    def city_codes(self) -> list[int]:
+        self.refresh()
+        return list(self._blocks)
+
+    def __contains__(self, city_code: object) -> bool:
+        self.refresh()
+        try:
+            return int(city_code) in self._blocks
+        except (TypeError, ValueError):
+            return False
+
+    def city(self, city_code: str | int, min_year: int | None = None) -> pd.DataFrame:
+        """Bloco do município, já ordenado por (ano, mês), a partir de min_year"""
+        self.refresh()
+        bounds = self._blocks.get(int(city_code))
+        if bounds is None:
+            return self.table.iloc[0:0]
+
+        start, end = bounds
+        if min_year is not None:
+            years = self.table["year"].to_numpy()[start:end]
+            start += int(np.searchsorted(years, min_year, side="left"))
+
+        return self.table.iloc[start:end]
+
+    def _build_feature_matrix(self, min_year: int) -> _FeatureMatrix:
+        table = self.table[self.table["year"] >= min_year]
+        previous = self._features.get(min_year)
+        if previous is None:
+            return _FeatureMatrix(build_features(table), dict(self._city_versions))
+
+        # Recalcula apenas os municípios cujos dados mudaram desde a última matriz
+        stale = [code for code, version in self._city_versions.items()
+                 if previous.city_versions.get(code) != version]
+        if not stale:
+            return _FeatureMatrix(previous.frame, dict(self._city_versions))
+
+        codes = previous.frame["municipality_code_ibge"]
+        kept = previous.frame[codes.isin(self._city_versions) & ~codes.isin(stale)]
+        fresh = build_features(table[table["municipality_code_ibge"].isin(stale)])
+        frame = pd.concat([kept, fresh], ignore_index=True)
+        frame = frame.sort_values(["municipality_code_ibge", "year", "month"], kind="stable").reset_index(drop=True)
+        return _FeatureMatrix(frame, dict(self._city_versions))
+
+    def _feature_matrix(self, min_year: int) -> _FeatureMatrix:
+        self.refresh()
+        with self._lock:
+            matrix = self._features.get(min_year)
+            if matrix is None or matrix.city_versions != self._city_versions:
+                matrix = self._build_feature_matrix(min_year)
+                self._features[min_year] = matrix
+            return matrix
+
+    def features(self, min_year: int = 2020) -> pd.DataFrame:
+        """Matriz de features de todos os municípios (a partir de min_year), calculada uma vez"""
+        return self._feature_matrix(min_year).frame
+
+    def climatology(self, min_year: int = 2020) -> pd.DataFrame:
+        """Medianas e quantis climáticos por (município, mês), montados em um único groupby"""
+        self.refresh()
+        with self._lock:
+            cached = self._climatology.get(min_year)
+            if cached is None or cached[0] != self._city_versions:
+                table = self.table[self.table["year"] >= min_year]
+                cached = (dict(self._city_versions), build_climatology(table))
+                self._climatology[min_year] = cached
+            return cached[1]
+
+    def city_features(self, city_code: str | int, min_year: int = 2020) -> pd.DataFrame:
+        """Fatia da matriz de features do município"""
+        matrix = self._feature_matrix(min_year)
+        start, end = matrix.blocks.get(int(city_code), (0, 0))
+        return matrix.frame.iloc[start:end]
+
+
+_DATASETS: dict[str, Dataset] = {}
+_DATASETS_LOCK = threading.Lock()
+
+
+def get_dataset(tablepath: str) -> Dataset:
+    """Instância compartilhada do Dataset para o caminho informado"""
+    key = os.path.abspath(tablepath)
+    with _DATASETS_LOCK:
+        if key not in _DATASETS:
+            _DATASETS[key] = Dataset(tablepath)
+        return _DATASETS[key]
+
+
+def release_dataset(tablepath: str) -> None:
+    """Descarta a instância compartilhada (ex.: tabelas temporárias do modo em blocos)"""
+    with _DATASETS_LOCK:
+        _DATASETS.pop(os.path.abspath(tablepath), None)
@@ -0,0 +1,180 @@
+import numpy as np
+import pandas as pd
+
+
+GROUP_COL = "municipality_code_ibge"
+CLIMATE_COLS: list[str] = ["rainfall_mm", "average_temperature", "average_humidity"]
+
+# Arboviroses suportadas: coluna de casos na tabela mestre e evento CAP dos alertas
+DISEASES: dict[str, tuple[str, str]] = {
+    "dengue": ("dengue_cases", "Dengue"),
+    "chikungunya": ("chikungunya_cases", "Chikungunya"),
+    "zika": ("zika_cases", "Zika"),
+}
+DEFAULT_DISEASE = "dengue"
+
+# Features derivadas dos casos (um conjunto por doença) e o target
+CASE_DERIVED_COLS: list[str] = [
+    "cases_lag_1", "cases_lag_2", "cases_lag_3", "cases_rolling_3", "cases_rolling_6", "cases_diff", "target"
+]
+
+
+def _position_in_group(codes: np.ndarray) -> np.ndarray:
+    """Posição de cada linha dentro do seu município (0, 1, 2, ...), com a tabela já agrupada"""
+    n = len(codes)
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if n else np.array([], dtype=np.int64)
+    group_start = np.repeat(starts, np.diff(np.r_[starts, n]))
+    return np.arange(n) - group_start
+
+
+def _float(values: np.ndarray) -> np.ndarray:
+    # Mesmo comportamento do pandas: inteiros viram float64 ao ganhar NaN, floats mantêm o tipo
+    return values if np.issubdtype(values.dtype, np.floating) else values.astype(np.float64)
+
+
+def group_shift(values: np.ndarray, position: np.ndarray, periods: int) -> np.ndarray:
+    """Equivalente a groupby(...).shift(periods), sem laço por município"""
+    values = _float(values)
+    result = np.full(len(values), np.nan, dtype=values.dtype)
+    result[periods:] = values[:-periods]
+    result[position < periods] = np.nan
+    return result
+
+
+def group_rolling_mean(values: np.ndarray, position: np.ndarray, window: int) -> np.ndarray:
+    """Equivalente a groupby(...).rolling(window, min_periods=1).mean(), via somas acumuladas.
+
+    Como no pandas, meses sem valor (NaN) ficam fora da média em vez de contaminar a janela;
+    a janela só fica NaN quando não tem nenhum valor.
+    """
+    values = values.astype(np.float64)
+    present = ~np.isnan(values)
+    cumsum = np.cumsum(np.where(present, values, 0.0))
+    counts = np.cumsum(present)
+    # Soma e contagem acumuladas no início da janela (limitada ao início do município)
+    lookback = np.minimum(position + 1, window)
+    start_idx = np.arange(len(values)) - lookback
+    before = start_idx >= 0
+    window_start = np.where(before, cumsum[np.maximum(start_idx, 0)], 0.0)
+    window_count = counts - np.where(before, counts[np.maximum(start_idx, 0)], 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(window_count > 0, (cumsum - window_start) / window_count, np.nan)
+
+
+def _case_prefix(disease: str) -> str:
+    # Dengue mantém os nomes originais das features (e, portanto, as chaves dos modelos já salvos)
+    if disease not in DISEASES:
+        raise ValueError(f"Unknown disease: {disease}. Use one of {', '.join(DISEASES)}.")
+    return "" if disease == DEFAULT_DISEASE else f"{disease}_"
+
+
+def disease_columns(disease: str) -> dict[str, str]:
+    """Nome canônico (o do modelo de dengue) -> coluna da doença na matriz de features"""
+    prefix = _case_prefix(disease)
+    return {"dengue_cases": DISEASES[disease][0], **{col: f"{prefix}{col}" for col in CASE_DERIVED_COLS}}
+
+
+def available_diseases(df: pd.DataFrame) -> list[str]:
+    """Doenças cuja coluna de casos está presente na tabela"""
+    return [disease for disease, (cases_col, _) in DISEASES.items() if cases_col in df.columns]
+
+
+def disease_view(df: pd.DataFrame, disease: str) -> pd.DataFrame:
+    """Matriz de features com as colunas da doença nos nomes canônicos usados pelo modelo"""
+    if disease == DEFAULT_DISEASE:
+        return df
+    columns = disease_columns(disease)
+    missing = [col for col in columns.values() if col not in df.columns]
+    if missing:
+        raise ValueError(f"No {disease} cases in the table (missing: {', '.join(missing)})")
+    return df.assign(**{canonical: df[col] for canonical, col in columns.items()})
+
+
+def _add_case_features(df: pd.DataFrame, cases: np.ndarray, position: np.ndarray, prefix: str) -> None:
+    # Lag features (casos dos meses anteriores)
+    df[f"{prefix}cases_lag_1"] = group_shift(cases, position, 1)
+    df[f"{prefix}cases_lag_2"] = group_shift(cases, position, 2)
+    df[f"{prefix}cases_lag_3"] = group_shift(cases, position, 3)
+
+    # Médias móveis dos últimos 3 e 6 meses
+    df[f"{prefix}cases_rolling_3"] = group_rolling_mean(cases, position, 3)
+    df[f"{prefix}cases_rolling_6"] = group_rolling_mean(cases, position, 6)
+
+    # Tendência (diferença em relação ao mês anterior)
+    df[f"{prefix}cases_diff"] = _float(cases) - df[f"{prefix}cases_lag_1"].to_numpy()
+
+    # Target: casos do próximo mês (último mês de cada município fica sem target)
+    target = np.full(len(df), np.nan)
+    target[:-1] = _float(cases)[1:]
+    last_in_group = np.r_[position[1:] == 0, True] if len(df) else np.array([], dtype=bool)
+    target[last_in_group] = np.nan
+    df[f"{prefix}target"] = target
+
+
+def build_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Cria as features engenheiradas de todos os municípios em uma única passada vetorizada.
+
+    A tabela deve estar ordenada por (município, ano, mês), como no Dataset. As features de
+    calendário e clima são calculadas uma vez; as de casos, para cada doença presente na tabela
+    (dengue com os nomes canônicos, as demais com o prefixo da doença, ex.: zika_cases_lag_1).
+    """
+    df = df.copy()
+    position = _position_in_group(df[GROUP_COL].to_numpy())
+
+    # Features temporais cíclicas (captura sazonalidade)
+    df["month_sin"] = np.sin(2 * np.pi * df["month"] / 12)
+    df["month_cos"] = np.cos(2 * np.pi * df["month"] / 12)
+
+    for disease in available_diseases(df):
+        cases = df[DISEASES[disease][0]].to_numpy()
+        _add_case_features(df, cases, position, _case_prefix(disease))
+
+    # Features climáticas defasadas (clima do mês anterior influencia casos atuais)
+    df["rainfall_lag_1"] = group_shift(df["rainfall_mm"].to_numpy(), position, 1)
+    df["temp_lag_1"] = group_shift(df["average_temperature"].to_numpy(), position, 1)
+    df["humidity_lag_1"] = group_shift(df["average_humidity"].to_numpy(), position, 1)
+
+    # Interações entre variáveis climáticas
+    df["temp_humidity"] = df["average_temperature"] * df["average_humidity"]
+    df["rainfall_humidity"] = df["rainfall_mm"] * df["average_humidity"]
+
+    return df
+
+
+def build_climatology(df: pd.DataFrame, quantiles: tuple[float, ...] = (0.1, 0.9)) -> pd.DataFrame:
+    """Tabela climatológica por (município, mês): medianas e quantis de cada variável climática.
+
+    Meses sem histórico recebem a mediana geral do município. As colunas de quantis
+    seguem o padrão '<variável>_q<percentil>' (ex.: rainfall_mm_q90).
+    """
+    grouped = df.groupby([GROUP_COL, "month"])[CLIMATE_COLS]
+    climatology = grouped.median()
+    for q in quantiles:
+        quantile = grouped.quantile(q)
+        quantile.columns = [f"{col}_q{round(q * 100)}" for col in CLIMATE_COLS]
+        climatology = climatology.join(quantile)
+
+    # Grade completa município × 12 meses, com a mediana geral do município nos meses faltantes
+    codes = df[GROUP_COL].unique()
+    full_index = pd.MultiIndex.from_product([codes, range(1, 13)], names=[GROUP_COL, "month"])
+    climatology = climatology.reindex(full_index)
+    city_medians = df.groupby(GROUP_COL)[CLIMATE_COLS].median()
+    fallback = city_medians.reindex(climatology.index.get_level_values(GROUP_COL)).set_axis(climatology.index)
+    for col in climatology.columns:
+        base = col if col in CLIMATE_COLS else col.rsplit("_q", 1)[0]
+        climatology[col] = climatology[col].fillna(fallback[base])
+
+    return climatology
+
+
+def add_city_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Features de nível municipal para o modelo global: UF (prefixo IBGE) e incidência histórica"""
+    df = df.copy()
+    df["uf_code"] = df[GROUP_COL] // 100000
+
+    # Incidência média por 100 mil habitantes no histórico do município até o mês da linha
+    # (média expansiva): os meses seguintes, inclusive o alvo e o holdout, não entram na feature
+    incidence = (df["dengue_cases"] / df["estimated_population"] * 100000).to_numpy(dtype=np.float64)
+    position = _position_in_group(df[GROUP_COL].to_numpy())
+    df["incidence_rate"] = group_rolling_mean(incidence, position, max(len(df), 1))
+    return df
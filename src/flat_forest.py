@@ -0,0 +1,38 @@
+import numpy as np
+
+
+class FlatForest:
+    """Nós de todas as árvores de uma floresta ajustada em arrays contíguos.
+
+    Percorre as árvores juntas, um nível por vez, para prever uma única linha sem as
+    centenas de chamadas a tree.predict que o predict por árvore exige. Usado na previsão
+    recursiva, em que cada mês depende da previsão do anterior e não pode ir em lote.
+    """
+
+    def __init__(self, forest) -> None:
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        sizes = np.array([tree.node_count for tree in trees])
+        offsets = np.r_[0, np.cumsum(sizes)[:-1]]
+        self.roots = offsets.astype(np.intp)
+
+        # Filhos com índices globais; folhas apontam para si mesmas, então o laço pode seguir
+        # descendo sem máscara até todas as árvores chegarem a uma folha
+        node = np.arange(sizes.sum(), dtype=np.intp)
+        left = np.concatenate([tree.children_left + offset for tree, offset in zip(trees, offsets)])
+        right = np.concatenate([tree.children_right + offset for tree, offset in zip(trees, offsets)])
+        is_leaf = np.concatenate([tree.children_left == -1 for tree in trees])
+        self.left = np.where(is_leaf, node, left).astype(np.intp)
+        self.right = np.where(is_leaf, node, right).astype(np.intp)
+        self.feature = np.where(is_leaf, 0, np.concatenate([tree.feature for tree in trees])).astype(np.intp)
+        self.threshold = np.concatenate([tree.threshold for tree in trees])
+        self.value = np.concatenate([tree.value[:, 0, 0] for tree in trees])
+        self.max_depth = max(tree.max_depth for tree in trees)
+
+    def predict_row(self, x: np.ndarray) -> np.ndarray:
+        """Previsão de cada árvore para uma linha de features (já normalizada)"""
+        # Mesma precisão do sklearn, que compara as features em float32
+        x = np.asarray(x, dtype=np.float32).astype(np.float64)
+        nodes = self.roots
+        for _ in range(self.max_depth):
+            nodes = np.where(x[self.feature[nodes]] <= self.threshold[nodes], self.left[nodes], self.right[nodes])
+        return self.value[nodes]
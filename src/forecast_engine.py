@@ -0,0 +1,162 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Iterator
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+from alerts import Alert, AlertBatch, batch_sent, write_alerts_jsonl, write_cap_feed, write_cap_files
+from dataset import get_dataset
+from features import DEFAULT_DISEASE, DISEASES
+from predictor import Predictor, IBGE_CITY_CODES
+
+
+@dataclass
+class CityForecast:
+    city_code: str
+    forecast: pd.DataFrame | None = None
+    alerts: list[Alert] = field(default_factory=list)
+    error: str | None = None
+    disease: str = DEFAULT_DISEASE
+
+
+def pool_size(n_tasks: int, max_workers: int | None = None) -> tuple[int, int]:
+    """Processos do pool (no máximo um por tarefa) e threads por processo, dividindo os núcleos"""
+    cpu_count = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers or cpu_count, n_tasks or 1))
+    return max_workers, max(1, cpu_count // max_workers)
+
+
+def limit_worker_threads(threads_per_worker: int) -> None:
+    """Chamado no initializer de cada processo do pool (previsão, backtest e tuning).
+
+    Cada processo usa apenas a sua parte dos núcleos (BLAS/OpenMP e joblib do sklearn),
+    evitando que N processos × n_jobs=-1 disputem a CPU.
+    """
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(limits=threads_per_worker)
+
+
+# Predictor de cada processo do pool (criado uma vez por processo, no initializer)
+_WORKER_PREDICTOR: Predictor | None = None
+
+
+def _init_worker(tablepath: str, model_dir: str | None, threads_per_worker: int, mode: str, sent: str) -> None:
+    global _WORKER_PREDICTOR
+    # Todos os alertas da execução compartilham o carimbo de envio definido pelo processo principal
+    AlertBatch(sent).start()
+    limit_worker_threads(threads_per_worker)
+    _WORKER_PREDICTOR = Predictor(tablepath, model_dir=model_dir, n_jobs=threads_per_worker, mode=mode)
+
+
+def _forecast_city(city_code: str, start: tuple, n_months: int, recursive: bool = False,
+                   disease: str = DEFAULT_DISEASE) -> CityForecast:
+    try:
+        forecast, alerts = _WORKER_PREDICTOR.predict_horizon(city_code, start, n_months,
+                                                             recursive=recursive, disease=disease)
+        return CityForecast(city_code=city_code, forecast=forecast, alerts=alerts, disease=disease)
+    except Exception as e:
+        return CityForecast(city_code=city_code, error=f"{type(e).__name__}: {e}", disease=disease)
+
+
+def forecast_all(tablepath: str, start: tuple, n_months: int = 1, city_codes: list[str] | None = None,
+                 max_workers: int | None = None, model_dir: str | None = None,
+                 mode: str = "per_city", recursive: bool = False,
+                 diseases: tuple[str, ...] = (DEFAULT_DISEASE,)) -> Iterator[CityForecast]:
+    """Prevê todos os municípios em um pool de processos, devolvendo cada um assim que termina.
+
+    Sem city_codes, usa todos os municípios presentes na tabela. No modo "global", o modelo
+    único é treinado antes de abrir o pool, e os processos apenas o carregam do cache. Cada par
+    (município, doença) é uma tarefa; as features de clima e calendário de cada processo são
+    calculadas uma vez e compartilhadas entre as doenças.
+    """
+    if city_codes is None:
+        city_codes = [str(code) for code in get_dataset(tablepath).city_codes]
+
+    max_workers, threads_per_worker = pool_size(len(city_codes), max_workers)
+
+    if mode == "global":
+        # Treina (ou valida o cache) uma única vez, usando todos os núcleos
+        predictor = Predictor(tablepath, model_dir=model_dir, mode=mode)
+        for disease in diseases:
+            predictor._get_global_model(disease)
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(tablepath, model_dir, threads_per_worker, mode, batch_sent())
+    ) as executor:
+        futures = [executor.submit(_forecast_city, code, start, n_months, recursive, disease)
+                   for code in city_codes for disease in diseases]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Previsão de todos os municípios em paralelo")
+    parser.add_argument("--table", default=os.path.join(os.path.dirname(__file__), '..', 'data', 'master_table.csv'))
+    parser.add_argument("--start", required=True, help="Mês inicial no formato AAAA-MM")
+    parser.add_argument("--months", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--all", action="store_true", help="Todos os municípios da tabela (padrão: IBGE_CITY_CODES)")
+    parser.add_argument("--global-model", action="store_true", help="Um único modelo para todos os municípios")
+    parser.add_argument("--recursive", action="store_true",
+                        help="Realimenta os casos previstos como lags dos meses seguintes")
+    parser.add_argument("--diseases", default=DEFAULT_DISEASE,
+                        help=f"Doenças separadas por vírgula ({', '.join(DISEASES)})")
+    parser.add_argument("--memory-limit", type=int, default=None,
+                        help="Limite de memória em MiB: processa os municípios em blocos, em um único processo")
+    parser.add_argument("--format", choices=["csv", "cap", "jsonl"], default="csv",
+                        help="Previsões em CSV, feed XML CAP ou alertas em JSON Lines na saída padrão")
+    parser.add_argument("--cap-dir", default=None, help="Grava também um arquivo CAP por alerta neste diretório")
+    args = parser.parse_args()
+
+    if args.memory_limit and (args.global_model or args.workers):
+        # O modo em blocos roda em um único processo, com um modelo por município
+        parser.error("--memory-limit cannot be combined with --global-model or --workers")
+
+    start_year, start_month = args.start.split("-")
+    codes = None if args.all else list(IBGE_CITY_CODES)
+    diseases = tuple(disease.strip() for disease in args.diseases.split(","))
+    if args.memory_limit:
+        # Modo em blocos: a tabela nunca é carregada inteira (apenas modelos por município)
+        from chunked import ChunkStats, forecast_chunked
+        chunk_stats = ChunkStats()
+        results = forecast_chunked(args.table, (int(start_year), int(start_month)), args.months,
+                                   memory_limit_mb=args.memory_limit, city_codes=codes,
+                                   recursive=args.recursive, diseases=diseases, stats=chunk_stats)
+    else:
+        results = forecast_all(args.table, (start_year, start_month), args.months,
+                               city_codes=codes, max_workers=args.workers,
+                               mode="global" if args.global_model else "per_city", recursive=args.recursive,
+                               diseases=diseases)
+
+    def stream_alerts() -> Iterator[Alert]:
+        # Resultados emitidos à medida que cada município termina
+        if args.format == "csv":
+            print("municipality_code_ibge;year;month;predicted_cases;severity;disease")
+        for result in results:
+            if result.error is not None:
+                print(f"{result.city_code} ({result.disease}): {result.error}", file=sys.stderr)
+                continue
+            if args.format == "csv":
+                for row in result.forecast.itertuples(index=False):
+                    print(f"{result.city_code};{row.year};{row.month};{row.predicted_cases};{row.severity};"
+                          f"{result.disease}", flush=True)
+            for alert in result.alerts:
+                if args.cap_dir:
+                    write_cap_files([alert], args.cap_dir)
+                yield alert
+
+    alerts = stream_alerts()
+    if args.format == "cap":
+        write_cap_feed(alerts, sys.stdout)
+    elif args.format == "jsonl":
+        write_alerts_jsonl(alerts, sys.stdout)
+    else:
+        for _ in alerts:
+            pass
+    if args.memory_limit:
+        print(chunk_stats.summary(), file=sys.stderr)
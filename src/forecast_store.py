@@ -0,0 +1,159 @@
+from typing import Iterable
+import argparse
+import logging
+import os
+import threading
+
+import joblib
+import pandas as pd
+
+from alerts import Alert
+from forecast_engine import forecast_all
+from model_registry import ModelRegistry
+from predictor import GLOBAL_MODEL_NAME, IBGE_CITY_CODES, Predictor
+
+
+# Diretório padrão das previsões pré-calculadas (fora do controle de versão)
+DEFAULT_FORECAST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'forecasts')
+
+logger = logging.getLogger("arbo.forecast_store")
+
+
+class ForecastStore:
+    """Previsões pré-calculadas por (município, mês inicial, horizonte), versionadas pelos dados.
+
+    A versão de uma entrada combina a versão dos dados do município (ou da tabela, no modo
+    global), os hiperparâmetros do modelo e o modo de treino: quando qualquer um muda, a
+    entrada antiga deixa de ser encontrada e é substituída no próximo cálculo.
+    """
+
+    def __init__(self, predictor: Predictor, store_dir: str | None = None) -> None:
+        self.predictor = predictor
+        self.store_dir = store_dir or DEFAULT_FORECAST_DIR
+        self._worker: threading.Thread | None = None
+
+    def version(self, city_code: str) -> str:
+        dataset = self.predictor.dataset
+        if self.predictor.mode == "global":
+            data_version = dataset.version
+            params = self.predictor._rf_params(GLOBAL_MODEL_NAME)
+        else:
+            data_version = str(dataset.city_version(city_code))
+            params = self.predictor._rf_params(city_code)
+        return ModelRegistry.params_fingerprint({
+            "data": data_version, "params": params, "mode": self.predictor.mode
+        })[:16]
+
+    def _prefix(self, city_code: str, start: tuple, n_months: int) -> str:
+        year, month = (int(value) for value in start)
+        return f"{city_code}_{year}{month:02d}_{n_months}_"
+
+    def _path(self, city_code: str, start: tuple, n_months: int) -> str:
+        filename = f"{self._prefix(city_code, start, n_months)}{self.version(city_code)}.joblib"
+        return os.path.join(self.store_dir, filename)
+
+    def get(self, city_code: str, start: tuple, n_months: int) -> tuple[pd.DataFrame, list[Alert]] | None:
+        path = self._path(city_code, start, n_months)
+        if not os.path.exists(path):
+            return None
+        return joblib.load(path)
+
+    def put(self, city_code: str, start: tuple, n_months: int,
+            forecast: pd.DataFrame, alerts: list[Alert]) -> None:
+        os.makedirs(self.store_dir, exist_ok=True)
+        path = self._path(city_code, start, n_months)
+        # Escrita atômica, como no ModelRegistry
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        joblib.dump((forecast, alerts), tmp_path)
+        os.replace(tmp_path, path)
+
+        # Remove as versões antigas da mesma previsão
+        prefix = self._prefix(city_code, start, n_months)
+        for filename in os.listdir(self.store_dir):
+            if filename.startswith(prefix) and filename.endswith(".joblib") \
+                    and os.path.join(self.store_dir, filename) != path:
+                try:
+                    os.remove(os.path.join(self.store_dir, filename))
+                except FileNotFoundError:
+                    pass
+
+    def count(self, start: tuple, n_months: int) -> int:
+        """Quantas previsões (de qualquer versão) existem para o mês inicial e horizonte"""
+        if not os.path.isdir(self.store_dir):
+            return 0
+        year, month = (int(value) for value in start)
+        suffix = f"_{year}{month:02d}_{n_months}_"
+        return sum(1 for filename in os.listdir(self.store_dir)
+                   if filename.endswith(".joblib") and suffix in filename)
+
+    def get_or_compute(self, city_code: str, start: tuple, n_months: int) -> tuple[pd.DataFrame, list[Alert]]:
+        """Previsão do store ou, se ainda não calculada para esta versão, calculada agora"""
+        stored = self.get(city_code, start, n_months)
+        if stored is not None:
+            return stored
+        forecast, alerts = self.predictor.predict_horizon(city_code, start, n_months)
+        self.put(city_code, start, n_months, forecast, alerts)
+        return forecast, alerts
+
+    def precompute(self, city_codes: Iterable[str], start: tuple, n_months: int) -> int:
+        """Calcula as previsões ausentes dos municípios informados; devolve quantas calculou"""
+        computed = 0
+        for city_code in city_codes:
+            if self.get(city_code, start, n_months) is not None:
+                continue
+            try:
+                forecast, alerts = self.predictor.predict_horizon(city_code, start, n_months)
+            except ValueError:
+                # Município sem histórico suficiente: fica para o cálculo sob demanda
+                continue
+            except Exception:
+                # Uma falha isolada não interrompe o preenchimento dos demais municípios
+                logger.exception("Falha ao pré-calcular a previsão de %s", city_code)
+                continue
+            self.put(city_code, start, n_months, forecast, alerts)
+            computed += 1
+        return computed
+
+    def start_background(self, city_codes: Iterable[str], start: tuple, n_months: int) -> threading.Thread:
+        """Preenche o store em uma thread de fundo, com um Predictor próprio.
+
+        A thread não compartilha o cache de modelos em memória do chamador; os dois se
+        encontram apenas no disco (modelos e previsões).
+        """
+        if self._worker is not None and self._worker.is_alive():
+            return self._worker
+
+        predictor = Predictor(self.predictor.tablepath, model_dir=self.predictor.registry.model_dir,
+                              n_jobs=self.predictor.n_jobs, mode=self.predictor.mode)
+        worker_store = ForecastStore(predictor, self.store_dir)
+        self._worker = threading.Thread(
+            target=worker_store.precompute,
+            args=(list(city_codes), start, n_months),
+            name="forecast-store-precompute",
+            daemon=True,
+        )
+        self._worker.start()
+        return self._worker
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pré-calcula as previsões usadas pelo dashboard")
+    parser.add_argument("--table", default=os.path.join(os.path.dirname(__file__), '..', 'data', 'master_table.csv'))
+    parser.add_argument("--start", required=True, help="Mês inicial no formato AAAA-MM")
+    parser.add_argument("--months", type=int, default=2)
+    parser.add_argument("--all", action="store_true", help="Todos os municípios da tabela (padrão: IBGE_CITY_CODES)")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    start = tuple(int(value) for value in args.start.split("-"))
+    store = ForecastStore(Predictor(args.table))
+    codes = [str(code) for code in store.predictor.dataset.city_codes] if args.all else list(IBGE_CITY_CODES)
+    missing = [code for code in codes if store.get(code, start, args.months) is None]
+
+    # Os municípios ausentes são calculados em paralelo pelo forecast_engine
+    stored = 0
+    for result in forecast_all(args.table, start, args.months, city_codes=missing, max_workers=args.workers):
+        if result.error is None:
+            store.put(result.city_code, start, args.months, result.forecast, result.alerts)
+            stored += 1
+    print(f"Previsões no store: {len(codes) - len(missing) + stored}/{len(codes)} ({stored} calculadas agora)")
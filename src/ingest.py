@@ -0,0 +1,157 @@
+from dataclasses import dataclass, field
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from dataset import get_dataset
+from model_registry import ModelRegistry
+from storage import SCHEMA, is_store, normalize_columns, write_store
+from validation import COUNT_COLS, KEY_COLS, ValidationReport, repair_table, validate_table
+
+
+# Colunas obrigatórias nas linhas novas (id e municipality_name podem ser preenchidos pela tabela)
+REQUIRED_COLS: list[str] = [col for col in SCHEMA if col not in ("id", "municipality_name")]
+
+
+@dataclass
+class IngestReport:
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    affected_city_codes: list[str] = field(default_factory=list)
+    models_invalidated: int = 0
+    # Validação da tabela resultante (e reparo, quando pedido)
+    validation: ValidationReport | None = None
+
+
+def validate_rows(rows: pd.DataFrame) -> None:
+    """Valida as linhas novas antes do upsert. Lança ValueError com todos os problemas encontrados."""
+    problems: list[str] = []
+
+    missing = [col for col in REQUIRED_COLS if col not in rows.columns]
+    if missing:
+        raise ValueError(f"New rows are missing required columns: {', '.join(missing)}")
+
+    null_counts = rows[REQUIRED_COLS].isna().sum()
+    for col, count in null_counts[null_counts > 0].items():
+        problems.append(f"{count} empty value(s) in '{col}'")
+
+    months = rows["month"]
+    if ((months < 1) | (months > 12)).any():
+        problems.append("month must be between 1 and 12")
+
+    negative = (rows[COUNT_COLS] < 0).any()
+    for col in negative[negative].index:
+        problems.append(f"negative values in '{col}'")
+
+    duplicated = rows.duplicated(subset=KEY_COLS).sum()
+    if duplicated:
+        problems.append(f"{duplicated} duplicated (year, month, municipality) key(s)")
+
+    if problems:
+        raise ValueError("Invalid rows: " + "; ".join(problems))
+
+
+def upsert(table: pd.DataFrame, rows: pd.DataFrame) -> tuple[pd.DataFrame, IngestReport]:
+    """Insere ou atualiza as linhas pela chave (município, ano, mês)"""
+    rows = rows.copy()
+    report = IngestReport()
+
+    table_keys = pd.MultiIndex.from_frame(table[KEY_COLS].astype("int64"))
+    row_keys = pd.MultiIndex.from_frame(rows[KEY_COLS].astype("int64"))
+    # A tabela pode ter chaves repetidas (ex.: dezembros duplicados); compara com a última ocorrência
+    last = ~table_keys.duplicated(keep="last")
+    indexer = table_keys[last].get_indexer(row_keys)
+    exists = indexer >= 0
+    positions = np.where(exists, np.flatnonzero(last)[indexer], -1)
+
+    # Nome do município: vem da tabela quando não foi informado
+    names = table.drop_duplicates("municipality_code_ibge").set_index("municipality_code_ibge")["municipality_name"]
+    if "municipality_name" not in rows.columns:
+        rows["municipality_name"] = np.nan
+    rows["municipality_name"] = rows["municipality_name"].astype(object).fillna(
+        rows["municipality_code_ibge"].map(names).astype(object)
+    )
+    if rows["municipality_name"].isna().any():
+        raise ValueError("municipality_name is required for municipalities not yet in the table")
+
+    # Linhas existentes mantêm o id; linhas novas recebem ids sequenciais
+    ids = np.empty(len(rows), dtype=np.int64)
+    ids[exists] = table["id"].to_numpy()[positions[exists]]
+    next_id = int(table["id"].max()) + 1 if len(table) else 1
+    ids[~exists] = np.arange(next_id, next_id + int((~exists).sum()))
+    rows["id"] = ids
+    rows = normalize_columns(rows)
+
+    # Atualizações idênticas ao que já está na tabela não afetam o município
+    value_cols = [col for col in rows.columns if col not in KEY_COLS + ["id", "municipality_name"]]
+    old_values = table[value_cols].to_numpy(dtype=np.float64)[positions[exists]]
+    new_values = rows.loc[exists, value_cols].to_numpy(dtype=np.float64)
+    changed = np.ones(len(rows), dtype=bool)
+    changed[exists] = ~np.all(np.isclose(old_values, new_values, equal_nan=True), axis=1)
+
+    report.inserted = int((~exists).sum())
+    report.updated = int((exists & changed).sum())
+    report.unchanged = int((exists & ~changed).sum())
+    report.affected_city_codes = sorted({str(code) for code in rows.loc[changed, "municipality_code_ibge"]})
+
+    # Todas as ocorrências de uma chave atualizada são substituídas pela linha nova
+    kept = table[~table_keys.isin(row_keys[exists & changed])]
+    merged = pd.concat([kept, rows[changed]], ignore_index=True)
+    merged = normalize_columns(merged).sort_values(KEY_COLS, kind="stable").reset_index(drop=True)
+    return merged, report
+
+
+def ingest(tablepath: str, rows: pd.DataFrame, model_dir: str | None = None, repair: bool = False) -> IngestReport:
+    """Valida e grava novas linhas mensais, invalidando apenas os modelos dos municípios afetados.
+
+    A tabela resultante passa pelo validate_table; com repair=True, é corrigida pelo repair_table
+    (duplicatas, meses faltantes, valores inválidos) e os municípios corrigidos também são afetados.
+
+    O Dataset compartilhado deste processo adota a nova tabela sem reler o arquivo; outros
+    processos a relêem ao notar a mudança, mas continuam reutilizando os modelos dos
+    municípios que não mudaram (a chave do cache depende dos dados de cada município).
+    """
+    validate_rows(rows)
+
+    dataset = get_dataset(tablepath)
+    dataset.refresh()
+    merged, report = upsert(dataset.table, rows)
+    if repair:
+        merged, report.validation = repair_table(merged)
+        repaired = {str(code) for code in report.validation.problems["municipality_code_ibge"]}
+        report.affected_city_codes = sorted(set(report.affected_city_codes) | repaired)
+    else:
+        report.validation = validate_table(merged)
+    if not report.affected_city_codes:
+        return report
+
+    if is_store(tablepath):
+        write_store(merged, tablepath)
+    else:
+        # Mesmo formato da master_table.csv: separador ';' e BOM UTF-8
+        tmp_path = f"{tablepath}.{os.getpid()}.tmp"
+        merged.to_csv(tmp_path, sep=";", index=False, encoding="utf-8-sig")
+        os.replace(tmp_path, tablepath)
+
+    dataset.replace(merged)
+    report.models_invalidated = ModelRegistry(model_dir).invalidate(report.affected_city_codes)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingestão incremental de novas linhas mensais")
+    parser.add_argument("rows", help="CSV (separador ';') com as novas linhas")
+    parser.add_argument("--table", default=os.path.join(os.path.dirname(__file__), '..', 'data', 'master_table.csv'))
+    parser.add_argument("--repair", action="store_true",
+                        help="Corrige a tabela (duplicatas, meses faltantes, valores inválidos) antes de gravar")
+    args = parser.parse_args()
+
+    new_rows = pd.read_csv(args.rows, sep=";", encoding="utf-8-sig")
+    result = ingest(args.table, new_rows, repair=args.repair)
+    print(f"Inseridas: {result.inserted} | Atualizadas: {result.updated} | Sem mudança: {result.unchanged}")
+    print(f"Municípios afetados: {', '.join(result.affected_city_codes) or '-'}")
+    print(f"Modelos invalidados: {result.models_invalidated}")
+    print(f"Validação: {result.validation.summary()}")
@@ -1,17 +1,13 @@
 from predictor import Predictor, IBGE_CITY_CODES
-from alerts import Alert
 import pandas as pd
 
 
 def print_next_predictions(city_code: str):
     print("\n--- Next Predictions ---\n")
-    A: Alert = P.predict_outbreak(city_code, year="2025", month="11")
-    print(F"(2025/11): {A.predicted_cases} casos | Risco: {A.severity}")
-    A: Alert = P.predict_outbreak(city_code, year="2025", month="12")
-    print(F"(2025/12): {A.predicted_cases} casos | Risco: {A.severity}")
-    for i in range(1, 13):
-        B: Alert = P.predict_outbreak(city_code, year="2026", month=str(i))
-        print(F"(2026/{str(i).zfill(2)}): {B.predicted_cases} casos | Risco: {B.severity}")
+    # 2025/11 a 2026/12: um único treino, com os casos previstos de cada mês como lags do seguinte
+    _, alerts = P.predict_horizon(city_code, start=(2025, 11), n_months=14, recursive=True)
+    for A in alerts:
+        print(F"({A.year}/{A.month.zfill(2)}): {A.predicted_cases} casos | Risco: {A.severity}")
 
 
 def print_data(city_code: str):
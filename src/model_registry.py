@@ -0,0 +1,160 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable
+import hashlib
+import json
+import os
+import threading
+
+import joblib
+import pandas as pd
+
+
+# Diretório padrão dos modelos treinados (fora do controle de versão)
+DEFAULT_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models')
+
+# Subdiretório com os hiperparâmetros ajustados (um JSON por município ou modelo)
+TUNED_PARAMS_DIR = "tuned"
+
+
+@dataclass
+class TrainedModel:
+    """Modelo ajustado e tudo que é necessário para reutilizá-lo sem retreino"""
+    model: Any
+    scaler: Any
+    mae: float
+    r2: float
+    n_train: int
+    n_test: int
+    feature_cols: list[str]
+    params: dict[str, Any]
+    trained_at: str = field(default_factory=lambda: datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"))
+
+
+class ModelRegistry:
+    """Cache de modelos por (município, impressão digital dos dados, hiperparâmetros).
+
+    Os modelos ficam em memória e em disco (joblib); uma mudança nos dados do
+    município ou nos parâmetros gera uma nova chave e, portanto, um novo treino.
+    """
+
+    def __init__(self, model_dir: str | None = None) -> None:
+        self.model_dir = model_dir or DEFAULT_MODEL_DIR
+        self._memory: dict[str, TrainedModel] = {}
+        self._params: dict[str, tuple[float, dict[str, Any]]] = {}
+
+    @staticmethod
+    def data_fingerprint(df: pd.DataFrame) -> str:
+        hashed = pd.util.hash_pandas_object(df, index=False).values
+        return hashlib.sha1(hashed.tobytes()).hexdigest()
+
+    @staticmethod
+    def params_fingerprint(params: dict[str, Any]) -> str:
+        encoded = json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha1(encoded).hexdigest()
+
+    def make_key(self, city_code: str, df: pd.DataFrame | str, params: dict[str, Any]) -> str:
+        # df pode ser os próprios dados ou uma impressão digital já calculada (ex.: Dataset.version)
+        fingerprint = df if isinstance(df, str) else self.data_fingerprint(df)
+        return f"{city_code}_{fingerprint[:16]}_{self.params_fingerprint(params)[:8]}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.model_dir, f"{key}.joblib")
+
+    def get(self, key: str) -> TrainedModel | None:
+        if key in self._memory:
+            return self._memory[key]
+
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+
+        trained: TrainedModel = joblib.load(path)
+        self._memory[key] = trained
+        return trained
+
+    def put(self, key: str, trained: TrainedModel) -> None:
+        os.makedirs(self.model_dir, exist_ok=True)
+        # Escrita atômica: outro processo nunca lê um arquivo pela metade
+        tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        joblib.dump(trained, tmp_path)
+        os.replace(tmp_path, self._path(key))
+        self._memory[key] = trained
+        self._prune(key)
+
+    def get_or_train(self, key: str, train_fn: Callable[[], TrainedModel]) -> TrainedModel:
+        trained = self.get(key)
+        if trained is None:
+            trained = train_fn()
+            self.put(key, trained)
+        return trained
+
+    def clear_memory(self) -> None:
+        """Descarta os modelos mantidos em memória; continuam disponíveis no disco"""
+        self._memory.clear()
+
+    def _params_path(self, name: str) -> str:
+        return os.path.join(self.model_dir, TUNED_PARAMS_DIR, f"{name}.json")
+
+    def get_params(self, name: str) -> dict[str, Any] | None:
+        """Hiperparâmetros ajustados de um município (ou do modelo global), se houver"""
+        path = self._params_path(name)
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+
+        # Relê apenas quando outro processo regravou o arquivo
+        cached = self._params.get(name)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        with open(path, encoding="utf-8") as f:
+            params = json.load(f)["params"]
+        self._params[name] = (mtime, params)
+        return params
+
+    def put_params(self, name: str, params: dict[str, Any], **info: Any) -> None:
+        """Salva os hiperparâmetros vencedores; os modelos passam a ser treinados com eles"""
+        path = self._params_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"params": params, **info}, f, indent=2, default=str)
+        os.replace(tmp_path, path)
+        self._params.pop(name, None)
+
+    def invalidate(self, city_codes: list[str]) -> int:
+        """Descarta os modelos dos municípios informados (ex.: após ingestão de novos dados)"""
+        prefixes = tuple(f"{code}_" for code in city_codes)
+        if not prefixes:
+            return 0
+
+        for key in [k for k in self._memory if k.startswith(prefixes)]:
+            del self._memory[key]
+
+        removed = 0
+        if os.path.isdir(self.model_dir):
+            for filename in os.listdir(self.model_dir):
+                if filename.startswith(prefixes) and filename.endswith(".joblib"):
+                    try:
+                        os.remove(os.path.join(self.model_dir, filename))
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+        return removed
+
+    def _prune(self, key: str) -> None:
+        # Remove versões antigas do mesmo modelo (dados ou parâmetros desatualizados). O nome é
+        # tudo antes da impressão digital, então município e doença (ex.: 3106200_zika) não se misturam
+        name = key.rsplit("_", 2)[0]
+        for stale in [k for k in self._memory if k != key and k.rsplit("_", 2)[0] == name]:
+            del self._memory[stale]
+
+        for filename in os.listdir(self.model_dir):
+            if filename.endswith(".joblib") and filename != f"{key}.joblib" \
+                    and filename[:-len(".joblib")].rsplit("_", 2)[0] == name:
+                try:
+                    os.remove(os.path.join(self.model_dir, filename))
+                except FileNotFoundError:
+                    pass
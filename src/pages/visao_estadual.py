@@ -0,0 +1,123 @@
+import streamlit as st
+import plotly.express as px
+import sys
+import os
+
+#path para importar os módulos existentes (a página fica em src/pages)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from dashboard_data import (HORIZONTE_MESES, get_forecast_store, get_series, get_summary,
+                            load_data, load_geojson, proximo_mes)
+
+st.set_page_config(
+    page_title="Arboviral Predictor - Visão Estadual",
+    page_icon="🦟",
+    layout="wide"
+)
+
+# Cores das classes de severidade (as mesmas do painel de alertas)
+CORES_RISCO = {"Minor": "green", "Moderate": "orange", "Severe": "red"}
+
+df = load_data()
+if df.empty:
+    st.warning("Base de dados vazia ou não carregada.")
+    st.stop()
+
+# Previsões do próximo mês, lidas do store pré-calculado (sem treino na página)
+ano_prev, mes_prev = proximo_mes()
+codigos = tuple(str(codigo) for codigo in df['municipality_code_ibge'].unique())
+store = get_forecast_store(ano_prev, mes_prev, codigos)
+versao = store.predictor.dataset.version
+resumo = get_summary(ano_prev, mes_prev, codigos, versao, store.count((ano_prev, mes_prev), HORIZONTE_MESES))
+
+# sidebar: filtros da visão estadual
+st.sidebar.header("⚙️ Filtros da Visão Estadual")
+ufs = sorted(resumo['uf_code'].unique())
+ufs_selecionadas = st.sidebar.multiselect("UF (prefixo IBGE):", ufs, default=ufs)
+severidades = st.sidebar.multiselect("Severidade prevista:", list(CORES_RISCO), default=list(CORES_RISCO))
+periodo = st.sidebar.selectbox("Agregação das séries:", ["quarter", "year", "month"],
+                               format_func={"quarter": "Trimestral", "year": "Anual", "month": "Mensal"}.get)
+top_n = st.sidebar.slider("Municípios no gráfico de séries:", 5, 50, 10)
+
+filtrado = resumo[resumo['uf_code'].isin(ufs_selecionadas)]
+filtrado = filtrado[filtrado['severity'].isin(severidades) | (filtrado['status'] == "pendente")]
+
+st.title("🗺️ Visão Estadual")
+st.markdown(f"### Previsão para {mes_prev:02d}/{ano_prev} em todos os municípios")
+
+# KPIs (Indicadores Chave)
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Municípios", f"{len(filtrado)}")
+col2.metric("Previsões Prontas", f"{(filtrado['status'] == 'pronto').sum()}")
+col3.metric("Risco Alto", f"{(filtrado['severity'] == 'Severe').sum()}")
+col4.metric("Risco Médio", f"{(filtrado['severity'] == 'Moderate').sum()}")
+
+pendentes = int((resumo['status'] == "pendente").sum())
+if pendentes:
+    st.info(f"{pendentes} município(s) ainda em cálculo em segundo plano.")
+    if st.button("Atualizar"):
+        st.rerun()
+
+# Mapa coroplético pelo código IBGE
+st.subheader("🗺️ Severidade Prevista por Município")
+geojson = load_geojson(tuple(int(uf) for uf in ufs_selecionadas))
+if geojson is None:
+    st.warning("Malha municipal do IBGE indisponível (sem acesso à internet e sem cópia em data/geo).")
+elif not filtrado.empty:
+    mapa = px.choropleth(
+        filtrado.assign(codigo=filtrado['municipality_code_ibge'].astype(str)),
+        geojson=geojson,
+        locations='codigo',
+        featureidkey='properties.codarea',
+        color='severity',
+        color_discrete_map=CORES_RISCO,
+        hover_name='municipality_name',
+        hover_data={'predicted_cases': ':.0f', 'prob_severe': ':.0%', 'codigo': False},
+        labels={'severity': 'Severidade', 'predicted_cases': 'Casos previstos', 'prob_severe': 'Prob. risco alto'},
+    )
+    mapa.update_geos(fitbounds="locations", visible=False)
+    mapa.update_layout(margin=dict(l=0, r=0, t=0, b=0), height=550)
+    st.plotly_chart(mapa, use_container_width=True)
+
+# Tabela ordenável (clique no cabeçalho para ordenar)
+st.subheader("📋 Resumo por Município")
+st.dataframe(
+    filtrado.sort_values('predicted_incidence_100k', ascending=False)[[
+        'municipality_code_ibge', 'municipality_name', 'uf_code', 'last_cases', 'incidence_100k',
+        'predicted_cases', 'predicted_incidence_100k', 'severity', 'prob_severe', 'status'
+    ]],
+    column_config={
+        'municipality_code_ibge': st.column_config.TextColumn("Código IBGE"),
+        'municipality_name': "Município",
+        'uf_code': "UF",
+        'last_cases': st.column_config.NumberColumn("Casos (último mês)", format="%d"),
+        'incidence_100k': st.column_config.NumberColumn("Incidência /100 mil", format="%.1f"),
+        'predicted_cases': st.column_config.NumberColumn("Casos previstos", format="%d"),
+        'predicted_incidence_100k': st.column_config.NumberColumn("Incidência prevista /100 mil", format="%.1f"),
+        'severity': "Severidade",
+        'prob_severe': st.column_config.ProgressColumn("Prob. risco alto", min_value=0, max_value=1, format="%.2f"),
+        'status': "Status",
+    },
+    hide_index=True,
+    use_container_width=True,
+)
+
+# Séries reduzidas: totais por UF e os municípios de maior incidência prevista
+st.subheader("📉 Evolução dos Casos")
+col_uf, col_top = st.columns(2)
+
+series_uf = get_series(periodo, "uf_code", versao)
+series_uf = series_uf[series_uf['uf_code'].isin(ufs_selecionadas)]
+fig_uf = px.line(series_uf, x='period', y='dengue_cases', color='uf_code',
+                 title='Casos por UF', labels={'period': 'Período', 'dengue_cases': 'Casos', 'uf_code': 'UF'})
+col_uf.plotly_chart(fig_uf, use_container_width=True)
+
+top = filtrado.nlargest(top_n, 'predicted_incidence_100k')
+nomes = top.set_index('municipality_code_ibge')['municipality_name']
+series_top = get_series(periodo, "municipality_code_ibge", versao)
+series_top = series_top[series_top['municipality_code_ibge'].isin(nomes.index)]
+fig_top = px.line(series_top.assign(municipio=series_top['municipality_code_ibge'].map(nomes)),
+                  x='period', y='dengue_cases', color='municipio',
+                  title=f'Top {top_n} por incidência prevista',
+                  labels={'period': 'Período', 'dengue_cases': 'Casos', 'municipio': 'Município'})
+col_top.plotly_chart(fig_top, use_container_width=True)
@@ -1,10 +1,13 @@
-from alerts import Alert
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import mean_absolute_error, r2_score
-from datetime import datetime
+from alerts import Alert, batch_sent, cap_certainty
+from dataset import Dataset, get_dataset
+from features import DEFAULT_DISEASE, DISEASES, add_city_features, build_features, disease_view
+from flat_forest import FlatForest
+from model_registry import ModelRegistry, TrainedModel
+from profiling import Profiler
+from scenarios import BASELINE, ClimateScenario, apply_scenarios, median_climate, sample_climate
 import pandas as pd
 import numpy as np
+import weakref
 
 
 IBGE_CITY_CODES: dict[str, str] = {
@@ -18,227 +21,489 @@ IBGE_CITY_CODES: dict[str, str] = {
     "3170206": "Uberlândia",
 }
 
+# Hiperparâmetros do Random Forest (fazem parte da chave do cache de modelos)
+RF_PARAMS: dict = {
+    "n_estimators": 300,
+    "max_depth": 20,
+    "min_samples_split": 3,
+    "min_samples_leaf": 2,
+    "max_features": "sqrt",
+    "random_state": 42,
+}
+
+# Features usadas pelo modelo
+FEATURE_COLS: list[str] = [
+    # Temporal
+    'month_sin', 'month_cos',
+    # Casos históricos
+    'dengue_cases', 'cases_lag_1', 'cases_lag_2', 'cases_lag_3',
+    'cases_rolling_3', 'cases_rolling_6', 'cases_diff',
+    # Clima atual
+    'rainfall_mm', 'average_temperature', 'average_humidity',
+    # Clima defasado
+    'rainfall_lag_1', 'temp_lag_1', 'humidity_lag_1',
+    # Interações
+    'temp_humidity', 'rainfall_humidity',
+    # População
+    'estimated_population'
+]
+
+# Features de casos recalculadas a cada passo da previsão recursiva
+CASE_FEATURE_COLS: list[str] = [
+    'dengue_cases', 'cases_lag_1', 'cases_lag_2', 'cases_lag_3',
+    'cases_rolling_3', 'cases_rolling_6', 'cases_diff'
+]
+
+# Modelo global: as mesmas features + características do município
+GLOBAL_FEATURE_COLS: list[str] = FEATURE_COLS + ['uf_code', 'incidence_rate']
+
+# Modos de treino: um modelo por município ou um único modelo para todos
+TRAINING_MODES: tuple[str, ...] = ("per_city", "global")
+GLOBAL_MODEL_NAME = "global"
+
 
 class Predictor:
-    def __init__(self, tablepath: str) -> None:
+    def __init__(self, tablepath: str, model_dir: str | None = None, n_jobs: int = -1,
+                 mode: str = "per_city", profiler: Profiler | None = None) -> None:
+        if mode not in TRAINING_MODES:
+            raise ValueError(f"Unknown training mode: {mode}. Use one of {', '.join(TRAINING_MODES)}.")
+
         self.tablepath = tablepath
+        self.n_jobs = n_jobs
+        self.mode = mode
         self.model = None
         self.scaler = None
+        self.registry = ModelRegistry(model_dir)
+        self.dataset: Dataset = get_dataset(tablepath)
+        # Instrumentação opcional por estágio (desativada, salvo ARBO_PROFILE no ambiente)
+        self.profiler = profiler or Profiler.from_env()
+        # Árvores achatadas de cada floresta em memória, para a previsão recursiva
+        self._flat_forests: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
 
     def _load_data(self, city_code: str, min_year: int = 2020) -> pd.DataFrame:
-        if city_code not in IBGE_CITY_CODES:
+        if city_code not in IBGE_CITY_CODES and city_code not in self.dataset:
             raise ValueError("City code not found in IBGE city codes.")
         
-        result: pd.DataFrame = pd.read_csv(self.tablepath, sep=";")
-        result = result[result["municipality_code_ibge"] == int(city_code)]
-        result = result[result["year"] >= min_year]
-        result = result.sort_values(by=["year", "month"])
-        
-        return result
+        # Fatia do bloco já ordenado do município (a tabela é lida uma única vez)
+        return self.dataset.city(city_code, min_year=min_year)
+
+    def _city_name(self, city_code: str) -> str:
+        if city_code in IBGE_CITY_CODES:
+            return IBGE_CITY_CODES[city_code]
+        return str(self.dataset.city(city_code)["municipality_name"].iloc[0])
 
     def _create_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """Cria features engenheiradas para melhorar a predição"""
-        df = df.copy()
-        
-        # Features temporais cíclicas (captura sazonalidade)
-        df["month_sin"] = np.sin(2 * np.pi * df["month"] / 12)
-        df["month_cos"] = np.cos(2 * np.pi * df["month"] / 12)
-        
-        # Lag features (casos dos meses anteriores)
-        df["cases_lag_1"] = df["dengue_cases"].shift(1)
-        df["cases_lag_2"] = df["dengue_cases"].shift(2)
-        df["cases_lag_3"] = df["dengue_cases"].shift(3)
-        
-        # Média móvel dos últimos 3 meses
-        df["cases_rolling_3"] = df["dengue_cases"].rolling(window=3, min_periods=1).mean()
-        
-        # Média móvel dos últimos 6 meses
-        df["cases_rolling_6"] = df["dengue_cases"].rolling(window=6, min_periods=1).mean()
-        
-        # Tendência (diferença em relação ao mês anterior)
-        df["cases_diff"] = df["dengue_cases"].diff()
-        
-        # Features climáticas defasadas (clima do mês anterior influencia casos atuais)
-        df["rainfall_lag_1"] = df["rainfall_mm"].shift(1)
-        df["temp_lag_1"] = df["average_temperature"].shift(1)
-        df["humidity_lag_1"] = df["average_humidity"].shift(1)
-        
-        # Interações entre variáveis climáticas
-        df["temp_humidity"] = df["average_temperature"] * df["average_humidity"]
-        df["rainfall_humidity"] = df["rainfall_mm"] * df["average_humidity"]
-        
-        return df
+        return build_features(df)
 
-    def get_cases_history(self, city_code: str) -> pd.DataFrame:
-        df = self._load_data(city_code)
-        return df[["year", "month", "dengue_cases"]]
+    def _rf_params(self, name: str) -> dict:
+        """Hiperparâmetros do modelo: os ajustados pelo tuning.py, quando existirem, ou RF_PARAMS.
 
-    def predict_outbreak(self, city_code: str, year: str, month: str) -> Alert:
-        future_year = int(year)
-        future_month = int(month)
-        
-        # Carregar todos os dados históricos
-        df = self._load_data(city_code)
-        
-        # Criar features engenheiradas
-        df = self._create_features(df)
-        
-        # Preparar dados para treinamento
-        # Target: casos do próximo mês
-        df["target"] = df["dengue_cases"].shift(-1)
-        
-        # Remover linhas com NaN (causadas por shift e rolling)
-        df_clean = df.dropna().copy()
-        
-        # Definir features para o modelo
-        feature_cols = [
-            # Temporal
-            'month_sin', 'month_cos',
-            # Casos históricos
-            'dengue_cases', 'cases_lag_1', 'cases_lag_2', 'cases_lag_3',
-            'cases_rolling_3', 'cases_rolling_6', 'cases_diff',
-            # Clima atual
-            'rainfall_mm', 'average_temperature', 'average_humidity',
-            # Clima defasado
-            'rainfall_lag_1', 'temp_lag_1', 'humidity_lag_1',
-            # Interações
-            'temp_humidity', 'rainfall_humidity',
-            # População
-            'estimated_population'
-        ]
+        name é o nome do modelo (_model_name), então cada doença usa os seus próprios parâmetros.
+        """
+        return {**RF_PARAMS, **(self.registry.get_params(name) or {})}
+
+    def _train_model(self, df: pd.DataFrame, feature_cols: list[str] = FEATURE_COLS,
+                     params: dict | None = None) -> TrainedModel:
+        """Treina o Random Forest a partir do DataFrame com features e target"""
+        # Importados só aqui: histórico, alertas e modelos em cache não pagam o import do sklearn
+        from sklearn.ensemble import RandomForestRegressor
+        from sklearn.preprocessing import StandardScaler
+        from sklearn.metrics import mean_absolute_error, r2_score
+
+        # Remover linhas com NaN (causadas por shift e rolling); colunas de outras doenças não contam
+        df_clean = df.dropna(subset=list(feature_cols) + ["target"]).copy()
         
         X = df_clean[feature_cols]
         y = df_clean["target"]
         
         # Dividir em treino (80%) e teste (20%) - últimos 20% para validação temporal
-        split_idx = int(len(X) * 0.8)
-        X_train, X_test = X.iloc[:split_idx], X.iloc[split_idx:]
-        y_train, y_test = y.iloc[:split_idx], y.iloc[split_idx:]
+        if self.mode == "global":
+            # Vários municípios: o corte é feito no calendário, não na ordem das linhas
+            period = df_clean["year"].to_numpy() * 12 + df_clean["month"].to_numpy()
+            periods = np.unique(period)
+            is_train = period < periods[int(len(periods) * 0.8)]
+        else:
+            is_train = np.arange(len(X)) < int(len(X) * 0.8)
+        X_train, X_test = X[is_train], X[~is_train]
+        y_train, y_test = y[is_train], y[~is_train]
         
         # Normalizar features
-        self.scaler = StandardScaler()
-        X_train_scaled = self.scaler.fit_transform(X_train)
-        X_test_scaled = self.scaler.transform(X_test)
+        with self.profiler.stage("scaler_fit", rows=len(X)):
+            scaler = StandardScaler()
+            X_train_scaled = scaler.fit_transform(X_train)
+            X_test_scaled = scaler.transform(X_test)
         
         # Treinar modelo
-        self.model = RandomForestRegressor(
-            n_estimators=300,
-            max_depth=20,
-            min_samples_split=3,
-            min_samples_leaf=2,
-            max_features='sqrt',
-            random_state=42,
-            n_jobs=-1
-        )
-        self.model.fit(X_train_scaled, y_train)
+        params = params or RF_PARAMS
+        with self.profiler.stage("forest_fit", rows=len(X_train)):
+            model = RandomForestRegressor(**params, n_jobs=self.n_jobs)
+            model.fit(X_train_scaled, y_train)
         
         # Avaliar modelo
-        y_pred_test = self.model.predict(X_test_scaled)
-        mae = mean_absolute_error(y_test, y_pred_test)
-        r2 = r2_score(y_test, y_pred_test)
-        
-        # print(f"\n{'='*50}")
-        # print(f"MÉTRICAS DO MODELO - {IBGE_CITY_CODES[city_code]}")
-        # print(f"{'='*50}")
-        # print(f"MAE (Erro Médio Absoluto): {mae:.2f} casos")
-        # print(f"R² (Coeficiente de Determinação): {r2:.4f}")
-        # print(f"Tamanho do treino: {len(X_train)} meses")
-        # print(f"Tamanho do teste: {len(X_test)} meses")
-        # print(f"{'='*50}\n")
-        
-        # ===== PREPARAR INPUT PARA PREVISÃO =====
+        with self.profiler.stage("holdout_scoring", rows=len(X_test)):
+            y_pred_test = model.predict(X_test_scaled)
+            mae = mean_absolute_error(y_test, y_pred_test)
+            r2 = r2_score(y_test, y_pred_test)
+        
+        return TrainedModel(
+            model=model,
+            scaler=scaler,
+            mae=float(mae),
+            r2=float(r2),
+            n_train=len(X_train),
+            n_test=len(X_test),
+            feature_cols=list(feature_cols),
+            params=dict(params)
+        )
+
+    @staticmethod
+    def _model_name(name: str, disease: str) -> str:
+        # Dengue mantém os nomes (e as chaves) originais; as demais doenças têm modelos próprios,
+        # ainda com o prefixo do município para que ModelRegistry.invalidate os encontre
+        return name if disease == DEFAULT_DISEASE else f"{name}_{disease}"
+
+    def _get_model(self, city_code: str, df_raw: pd.DataFrame, df: pd.DataFrame,
+                   disease: str = DEFAULT_DISEASE) -> TrainedModel:
+        # A chave depende apenas dos dados brutos do município e dos hiperparâmetros,
+        # então o mesmo modelo é reutilizado até a tabela de origem mudar
+        params = self._rf_params(self._model_name(city_code, disease))
+        key = self.registry.make_key(self._model_name(city_code, disease), df_raw, {**params, "features": FEATURE_COLS})
+        return self.registry.get_or_train(key, lambda: self._train_model(df, params=params))
+
+    def _get_global_model(self, disease: str = DEFAULT_DISEASE) -> TrainedModel:
+        # Um único modelo para todos os municípios, reutilizado até a tabela mudar
+        params = self._rf_params(self._model_name(GLOBAL_MODEL_NAME, disease))
+        # "incidence_rate" na chave: modelos salvos com a média do histórico inteiro são retreinados
+        key = self.registry.make_key(self._model_name(GLOBAL_MODEL_NAME, disease), self.dataset.version,
+                                     {**params, "features": GLOBAL_FEATURE_COLS, "incidence_rate": "expanding"})
+        return self.registry.get_or_train(
+            key,
+            lambda: self._train_model(add_city_features(disease_view(self.dataset.features(), disease)),
+                                      GLOBAL_FEATURE_COLS, params)
+        )
+
+    def get_cases_history(self, city_code: str, disease: str = DEFAULT_DISEASE) -> pd.DataFrame:
+        df = self._load_data(city_code)
+        return df[["year", "month", DISEASES[disease][0]]]
+
+    def _prepare(self, city_code: str, disease: str = DEFAULT_DISEASE) -> tuple[pd.DataFrame, TrainedModel]:
+        """Carrega os dados do município, cria as features e obtém o modelo treinado"""
+        # Carregar todos os dados históricos
+        with self.profiler.stage("load", city_code=city_code) as stage:
+            df_raw = self._load_data(city_code)
+            stage.rows = len(df_raw)
+        
+        # Fatia da matriz de features (com o target: casos do próximo mês), calculada uma única
+        # vez para todos os municípios e doenças; a da doença pedida fica nos nomes canônicos
+        with self.profiler.stage("features", city_code=city_code) as stage:
+            df = disease_view(self.dataset.city_features(city_code), disease)
+            stage.rows = len(df)
+        
+        # Obter modelo treinado (do cache, ou treinar se os dados mudaram)
+        if self.mode == "global":
+            df = add_city_features(df)
+            trained = self._get_global_model(disease)
+        else:
+            trained = self._get_model(city_code, df_raw, df, disease)
+        # n_jobs não faz parte da chave do cache: um modelo salvo por outro processo
+        # usa o limite de threads deste Predictor
+        trained.model.n_jobs = self.n_jobs
+        # Só registra o último modelo usado; as previsões usam sempre o trained da própria chamada,
+        # para que chamadas concorrentes no mesmo Predictor não misturem municípios
+        self.model = trained.model
+        self.scaler = trained.scaler
+
+        # Métricas do modelo (MAE, R², tamanhos de treino/teste) no log de instrumentação
+        self.profiler.event("model_metrics", city_code=city_code, disease=disease, mae=trained.mae, r2=trained.r2,
+                            n_train=trained.n_train, n_test=trained.n_test, trained_at=trained.trained_at)
+
+        return df, trained
+
+    def _build_future_inputs(self, city_code: str, df: pd.DataFrame, months: np.ndarray,
+                             feature_cols: list[str] = FEATURE_COLS,
+                             climate: tuple[np.ndarray, np.ndarray, np.ndarray] | None = None) -> pd.DataFrame:
+        """Monta uma linha de features por mês alvo, todas de uma vez.
+
+        climate=(chuva, temperatura, umidade) substitui as medianas históricas, uma entrada por linha.
+        """
+        n = len(months)
         
         # Obter o último registro completo (mais recente)
-        latest_complete = df.dropna().iloc[-1]
-        
-        # Calcular médias históricas do mês alvo (sazonalidade)
-        historical_month = df[df["month"] == future_month]
+        latest_complete = df.dropna(subset=list(feature_cols) + ["target"]).iloc[-1]
+        
+        if climate is None:
+            # Medianas históricas de cada mês alvo (sazonalidade), consultadas na
+            # tabela climatológica pré-calculada (mediana geral quando o mês não tem histórico)
+            climatology = self.dataset.climatology().loc[int(city_code)].reindex(months)
+            rainfall = climatology["rainfall_mm"].to_numpy()
+            temperature = climatology["average_temperature"].to_numpy()
+            humidity = climatology["average_humidity"].to_numpy()
+        else:
+            rainfall, temperature, humidity = climate
         
-        # Construir input para predição
         future_input = {
             # Temporal (mês alvo)
-            'month_sin': np.sin(2 * np.pi * future_month / 12),
-            'month_cos': np.cos(2 * np.pi * future_month / 12),
+            'month_sin': np.sin(2 * np.pi * months / 12),
+            'month_cos': np.cos(2 * np.pi * months / 12),
             
             # Casos mais recentes (usar últimos valores conhecidos)
-            'dengue_cases': latest_complete["dengue_cases"],
-            'cases_lag_1': latest_complete["dengue_cases"],
-            'cases_lag_2': latest_complete["cases_lag_1"],
-            'cases_lag_3': latest_complete["cases_lag_2"],
-            'cases_rolling_3': latest_complete["cases_rolling_3"],
-            'cases_rolling_6': latest_complete["cases_rolling_6"],
-            'cases_diff': latest_complete["cases_diff"],
+            'dengue_cases': np.full(n, latest_complete["dengue_cases"]),
+            'cases_lag_1': np.full(n, latest_complete["dengue_cases"]),
+            'cases_lag_2': np.full(n, latest_complete["cases_lag_1"]),
+            'cases_lag_3': np.full(n, latest_complete["cases_lag_2"]),
+            'cases_rolling_3': np.full(n, latest_complete["cases_rolling_3"]),
+            'cases_rolling_6': np.full(n, latest_complete["cases_rolling_6"]),
+            'cases_diff': np.full(n, latest_complete["cases_diff"]),
             
             # Clima (usar médias históricas do mês alvo)
-            'rainfall_mm': historical_month["rainfall_mm"].median() if len(historical_month) > 0 
-                          else df["rainfall_mm"].median(),
-            'average_temperature': historical_month["average_temperature"].median() if len(historical_month) > 0 
-                                  else df["average_temperature"].median(),
-            'average_humidity': historical_month["average_humidity"].median() if len(historical_month) > 0 
-                               else df["average_humidity"].median(),
+            'rainfall_mm': rainfall,
+            'average_temperature': temperature,
+            'average_humidity': humidity,
             
             # Clima defasado
-            'rainfall_lag_1': historical_month["rainfall_mm"].median() if len(historical_month) > 0 
-                             else df["rainfall_mm"].median(),
-            'temp_lag_1': historical_month["average_temperature"].median() if len(historical_month) > 0 
-                         else df["average_temperature"].median(),
-            'humidity_lag_1': historical_month["average_humidity"].median() if len(historical_month) > 0 
-                             else df["average_humidity"].median(),
+            'rainfall_lag_1': rainfall,
+            'temp_lag_1': temperature,
+            'humidity_lag_1': humidity,
             
             # Interações (calcular com base nos valores acima)
-            'temp_humidity': (historical_month["average_temperature"].median() if len(historical_month) > 0 
-                             else df["average_temperature"].median()) * 
-                            (historical_month["average_humidity"].median() if len(historical_month) > 0 
-                             else df["average_humidity"].median()),
-            'rainfall_humidity': (historical_month["rainfall_mm"].median() if len(historical_month) > 0 
-                                 else df["rainfall_mm"].median()) * 
-                                (historical_month["average_humidity"].median() if len(historical_month) > 0 
-                                 else df["average_humidity"].median()),
+            'temp_humidity': temperature * humidity,
+            'rainfall_humidity': rainfall * humidity,
             
             # População (usar mais recente)
-            'estimated_population': latest_complete["estimated_population"]
+            'estimated_population': np.full(n, latest_complete["estimated_population"])
         }
         
-        # Criar DataFrame e normalizar
-        X_future = pd.DataFrame([future_input])
-        X_future_scaled = self.scaler.transform(X_future)
-        
-        # Fazer predição
-        predicted_cases = int(self.model.predict(X_future_scaled)[0])
-        
-        # Garantir que não seja negativo
-        predicted_cases = max(0, predicted_cases)
+        # Características do município (modelo global)
+        for col in feature_cols:
+            if col not in future_input:
+                future_input[col] = np.full(n, latest_complete[col])
         
+        return pd.DataFrame(future_input, columns=feature_cols)
+
+    def _severity_thresholds(self, df: pd.DataFrame) -> tuple[float, float]:
         # Classificação de severidade baseada nos dados históricos do município
         # Calcula percentis dos casos históricos
         historical_cases = df["dengue_cases"].dropna()
         p65 = historical_cases.quantile(0.65) 
         p80 = historical_cases.quantile(0.80)  
         
+        # Minor: até o 65º percentil; Moderate: 65º-80º; Severe: acima do 80º
+        self.profiler.event("severity_thresholds", p65=float(p65), p80=float(p80))
+        
+        return float(p65), float(p80)
+
+    def _classify_severity(self, df: pd.DataFrame, predicted_cases: np.ndarray) -> np.ndarray:
+        p65, p80 = self._severity_thresholds(df)
+        
         # Classificação adaptativa
-        if predicted_cases > p80:
-            severity = "Severe"  # Acima de 90% dos casos históricos
-        elif predicted_cases > p65:
-            severity = "Moderate"  # Entre 75% e 90%
-        else:
-            severity = "Minor"  # Abaixo de 75%
-        
-        # print(f"Thresholds calculados para {IBGE_CITY_CODES[city_code]}:")
-        # print(f"  Minor: < {p50:.0f} casos (até 50º percentil)")
-        # print(f"  Moderate: {p50:.0f} - {p80:.0f} casos (50º-80º percentil)")
-        # print(f"  Severe: > {p80:.0f} casos (acima 80º percentil)")
-        # print(f"  Previsão: {predicted_cases} casos → {severity}\n")
-        
-        # Criar alerta
-        alert = Alert(
-            event="Dengue",
-            severity=severity,
-            certainly=f"Confiança: MAE={mae:.0f} casos, R²={r2:.3f}",
-            year=year,
-            month=month,
-            predicted_cases=predicted_cases,
-            city_name=IBGE_CITY_CODES[city_code],
-            city_code=city_code
+        return np.select(
+            [predicted_cases > p80, predicted_cases > p65],
+            ["Severe", "Moderate"],  # Acima do 80º / entre o 65º e o 80º percentil
+            default="Minor"  # Abaixo do 65º percentil
+        )
+
+    @staticmethod
+    def _tree_predictions(model, X_scaled: np.ndarray) -> np.ndarray:
+        """Previsões de cada árvore da floresta (árvores × linhas); a média é o predict da floresta"""
+        X_scaled = np.ascontiguousarray(X_scaled, dtype=np.float32)
+        return np.stack([tree.predict(X_scaled, check_input=False) for tree in model.estimators_])
+
+    @staticmethod
+    def _target_months(start: tuple, n_months: int) -> tuple[np.ndarray, np.ndarray]:
+        """Sequência de (ano, mês) a partir do mês inicial"""
+        start_year, start_month = int(start[0]), int(start[1])
+        offsets = start_month - 1 + np.arange(n_months)
+        return start_year + offsets // 12, offsets % 12 + 1
+
+    def _recursive_tree_predictions(self, city_code: str, df: pd.DataFrame, years: np.ndarray,
+                                    months: np.ndarray, trained) -> np.ndarray:
+        """Previsões por árvore (árvores × meses), realimentando a média prevista como lag do mês seguinte.
+
+        Os meses entre o último mês observado e o início pedido também são previstos, só para
+        alimentar os lags. Clima, sazonalidade e população são montados de uma vez; a cada passo
+        só as colunas de casos mudam, em arrays pré-alocados.
+        """
+        observed = df["dengue_cases"].dropna()
+        last = df.loc[observed.index[-1]]
+        last_period = int(last["year"]) * 12 + int(last["month"]) - 1
+        first_period = int(years[0]) * 12 + int(months[0]) - 1
+        gap = max(first_period - last_period - 1, 0)
+        step_months = np.r_[(last_period + 1 + np.arange(gap)) % 12 + 1, months]
+        n_steps = len(step_months)
+        
+        # Colunas fixas (clima, sazonalidade, população) de todos os passos, já normalizadas
+        feature_cols = trained.feature_cols
+        X = self._build_future_inputs(city_code, df, step_months, feature_cols).to_numpy(dtype=np.float64)
+        mean, scale = trained.scaler.mean_, trained.scaler.scale_
+        case_idx = [feature_cols.index(col) for col in CASE_FEATURE_COLS]
+        
+        # Série de casos: os últimos 6 observados seguidos dos valores previstos
+        known = observed.to_numpy(dtype=np.float64)[-6:]
+        cases = np.empty(len(known) + n_steps)
+        cases[:len(known)] = known
+        flat = self._flat_forests.get(trained.model)
+        if flat is None:
+            flat = self._flat_forests[trained.model] = FlatForest(trained.model)
+        tree_predictions = np.empty((len(trained.model.estimators_), n_steps))
+        
+        for step in range(n_steps):
+            i = len(known) + step - 1  # último mês conhecido (observado ou previsto)
+            X[step, case_idx] = (
+                cases[i], cases[i - 1], cases[i - 2], cases[i - 3],
+                cases[max(i - 2, 0):i + 1].mean(), cases[max(i - 5, 0):i + 1].mean(),
+                cases[i] - cases[i - 1],
+            )
+            tree_predictions[:, step] = flat.predict_row((X[step] - mean) / scale)
+            cases[i + 1] = max(tree_predictions[:, step].mean(), 0.0)
+        
+        return tree_predictions[:, gap:]
+
+    def _forecast_matrix(self, city_code: str, start: tuple, n_months: int, recursive: bool = False,
+                         disease: str = DEFAULT_DISEASE):
+        years, months = self._target_months(start, n_months)
+        df, trained = self._prepare(city_code, disease)
+        
+        with self.profiler.stage("inference", rows=n_months, city_code=city_code, recursive=recursive):
+            if recursive:
+                tree_predictions = self._recursive_tree_predictions(city_code, df, years, months, trained)
+            else:
+                # Criar matriz de entrada, normalizar e prever todos os meses de uma vez
+                X_future = self._build_future_inputs(city_code, df, months, trained.feature_cols)
+                X_future_scaled = trained.scaler.transform(X_future)
+                tree_predictions = self._tree_predictions(trained.model, X_future_scaled)
+        
+        return years, months, df, trained, tree_predictions
+
+    def predict_distribution(self, city_code: str, start: tuple, n_months: int,
+                             quantiles: tuple[float, ...] = (0.05, 0.25, 0.5, 0.75, 0.95),
+                             recursive: bool = False, disease: str = DEFAULT_DISEASE) -> pd.DataFrame:
+        """Intervalos de previsão e probabilidades de excedência a partir das árvores da floresta.
+
+        Sem retreino nem bootstrap: as 300 previsões individuais de cada mês formam a distribuição.
+        """
+        years, months, df, _, tree_predictions = self._forecast_matrix(city_code, start, n_months, recursive, disease)
+        p65, p80 = self._severity_thresholds(df)
+        tree_predictions = np.maximum(tree_predictions, 0)
+        
+        result = pd.DataFrame({
+            "year": years,
+            "month": months,
+            "mean_cases": tree_predictions.mean(axis=0),
+        })
+        for q, values in zip(quantiles, np.quantile(tree_predictions, quantiles, axis=0)):
+            result[f"cases_q{round(q * 100)}"] = values
+        result["prob_above_p65"] = (tree_predictions > p65).mean(axis=0)
+        result["prob_above_p80"] = (tree_predictions > p80).mean(axis=0)
+        return result
+
+    def predict_scenarios(self, city_code: str, start: tuple, n_months: int,
+                          scenarios: list[ClimateScenario] | None = None, n_draws: int = 0,
+                          seed: int | None = None,
+                          quantiles: tuple[float, ...] = (0.05, 0.5, 0.95),
+                          disease: str = DEFAULT_DISEASE) -> pd.DataFrame:
+        """Distribuição de casos por cenário climático e mês, com um único predict no modelo em cache.
+
+        Sem n_draws, cada cenário perturba as medianas climatológicas; com n_draws, perturba
+        n_draws trajetórias sorteadas da climatologia, e a distribuição de cada mês reúne
+        árvores × sorteios. Todas as linhas (cenários × sorteios × meses) formam uma só matriz.
+        """
+        scenarios = list(scenarios or [BASELINE])
+        years, months = self._target_months(start, n_months)
+        df, trained = self._prepare(city_code, disease)
+        
+        # Trajetórias climáticas (sorteios × meses) e cenários aplicados a todas elas
+        climatology = self.dataset.climatology().loc[int(city_code)].reindex(months)
+        draws = sample_climate(climatology, n_draws, seed) if n_draws else median_climate(climatology)
+        rainfall, temperature, humidity = apply_scenarios(scenarios, *draws)
+        n_scenarios, n_paths, _ = rainfall.shape
+        
+        with self.profiler.stage("scenario_inference", rows=rainfall.size, city_code=city_code):
+            X = self._build_future_inputs(
+                city_code, df, np.tile(months, n_scenarios * n_paths), trained.feature_cols,
+                climate=(rainfall.ravel(), temperature.ravel(), humidity.ravel())
+            )
+            tree_predictions = np.maximum(self._tree_predictions(trained.model, trained.scaler.transform(X)), 0)
+        
+        # (árvores, cenários, sorteios, meses) -> (cenários, meses, árvores × sorteios)
+        n_trees = tree_predictions.shape[0]
+        samples = (tree_predictions.reshape(n_trees, n_scenarios, n_paths, n_months)
+                   .transpose(1, 3, 0, 2).reshape(n_scenarios, n_months, n_trees * n_paths))
+        p65, p80 = self._severity_thresholds(df)
+        
+        result = pd.DataFrame({
+            "scenario": np.repeat([scenario.name for scenario in scenarios], n_months),
+            "year": np.tile(years, n_scenarios),
+            "month": np.tile(months, n_scenarios),
+            "mean_cases": samples.mean(axis=-1).ravel(),
+        })
+        for q, values in zip(quantiles, np.quantile(samples, quantiles, axis=-1)):
+            result[f"cases_q{round(q * 100)}"] = values.ravel()
+        result["prob_above_p65"] = (samples > p65).mean(axis=-1).ravel()
+        result["prob_above_p80"] = (samples > p80).mean(axis=-1).ravel()
+        return result
+
+    def predict_horizon(self, city_code: str, start: tuple, n_months: int,
+                        recursive: bool = False, disease: str = DEFAULT_DISEASE) -> tuple[pd.DataFrame, list[Alert]]:
+        """Prevê n_months meses a partir de start=(ano, mês) com um único treino e um único predict.
+
+        Com recursive=True, os casos previstos de cada mês viram os lags e médias móveis do
+        mês seguinte, em vez de todos os meses partirem dos últimos valores conhecidos.
+        disease escolhe a coluna de casos (ver features.DISEASES) e o evento CAP dos alertas.
+        """
+        years, months, df, trained, tree_predictions = self._forecast_matrix(
+            city_code, start, n_months, recursive, disease
         )
         
-        return alert
\ No newline at end of file
+        # Garantir que não seja negativo
+        predicted_cases = np.maximum(tree_predictions.mean(axis=0).astype(int), 0)
+        severities = self._classify_severity(df, predicted_cases)
+        
+        # Intervalo de 80% e probabilidade de ultrapassar o limiar de severidade alta (p80)
+        p65, p80 = self._severity_thresholds(df)
+        low, high = np.maximum(np.quantile(tree_predictions, [0.1, 0.9], axis=0), 0)
+        prob_severe = (tree_predictions > p80).mean(axis=0)
+        # <certainty> do alerta: fração das árvores na mesma classe de severidade prevista
+        # (um "Minor" com todas as árvores abaixo do p65 é "Likely", não "Unlikely")
+        tree_severities = np.select([tree_predictions > p80, tree_predictions > p65], ["Severe", "Moderate"],
+                                    default="Minor")
+        prob_class = (tree_severities == severities).mean(axis=0)
+        
+        forecast = pd.DataFrame({
+            "year": years,
+            "month": months,
+            "predicted_cases": predicted_cases,
+            "severity": severities,
+            "cases_low": low.astype(int),
+            "cases_high": high.astype(int),
+            "prob_severe": prob_severe,
+        })
+        
+        # Criar alertas (todos com o mesmo carimbo de envio)
+        with self.profiler.stage("alert_building", rows=n_months, city_code=city_code):
+            sent = batch_sent()
+            alerts = [
+                Alert(
+                    event=DISEASES[disease][1],
+                    severity=str(severity),
+                    certainly=cap_certainty(certainty),
+                    year=str(y),
+                    month=str(m),
+                    predicted_cases=int(cases),
+                    city_name=self._city_name(city_code),
+                    city_code=city_code,
+                    sent=sent,
+                    exceedance_probability=round(float(prob), 3),
+                    cases_low=int(lo),
+                    cases_high=int(hi),
+                    accuracy=f"Confiança: MAE={trained.mae:.0f} casos, R²={trained.r2:.3f}"
+                )
+                for y, m, cases, severity, prob, certainty, lo, hi
+                in zip(years, months, predicted_cases, severities, prob_severe, prob_class, low, high)
+            ]
+        
+        return forecast, alerts
+
+    def predict_outbreak(self, city_code: str, year: str, month: str, disease: str = DEFAULT_DISEASE) -> Alert:
+        _, alerts = self.predict_horizon(city_code, (year, month), 1, disease=disease)
+        return alerts[0]
@@ -0,0 +1,174 @@
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Iterator, TextIO
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+
+# Ativa a instrumentação sem mudar código: ARBO_PROFILE=1 (log) ou ARBO_PROFILE=<arquivo.jsonl>
+PROFILE_ENV = "ARBO_PROFILE"
+
+logger = logging.getLogger("arbo.profiling")
+
+# Registros individuais guardados em memória (os mais antigos são descartados); os totais
+# por estágio continuam acumulando todas as chamadas
+MAX_RECORDS = 10_000
+
+
+def rss_bytes() -> int | None:
+    """Memória residente do processo (Linux); None quando não disponível"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_bytes() -> int | None:
+    """Pico de memória residente do processo desde o início; None quando não disponível"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    # ru_maxrss vem em KiB no Linux e em bytes no macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+@dataclass
+class StageRecord:
+    stage: str
+    seconds: float
+    rows: int | None = None
+    memory_delta_bytes: int | None = None
+    labels: dict[str, Any] = field(default_factory=dict)
+
+
+class _StageHandle:
+    """Permite informar o número de linhas depois de entrar no estágio"""
+    __slots__ = ("rows",)
+
+    def __init__(self, rows: int | None) -> None:
+        self.rows = rows
+
+
+class Profiler:
+    """Tempo, linhas e variação de memória de cada estágio do pipeline de previsão.
+
+    Desativado, stage() é um contexto vazio e event() não faz nada. Cada registro vira uma
+    linha JSON (no logger 'arbo.profiling', que escreve na saída de erro se a aplicação não
+    configurou outro destino, ou em log_path), e os totais por estágio podem ser exportados
+    no formato de texto do Prometheus.
+    """
+
+    def __init__(self, enabled: bool = True, log_path: str | None = None, trace_memory: bool = False) -> None:
+        self.enabled = enabled
+        self.log_path = log_path
+        # tracemalloc mede só alocações do Python, com custo alto; o padrão é o RSS do processo
+        self.trace_memory = trace_memory
+        self.records: deque[StageRecord] = deque(maxlen=MAX_RECORDS)
+        self._totals: dict[str, dict[str, float]] = {}
+        self._lock = threading.Lock()
+        if enabled and trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if enabled and log_path is None and not logger.handlers:
+            # Sem isto o logger herda o nível WARNING da raiz e as linhas INFO se perdem
+            handler = logging.StreamHandler(sys.stderr)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+
+    @classmethod
+    def from_env(cls) -> "Profiler":
+        value = os.environ.get(PROFILE_ENV, "")
+        if value in ("", "0"):
+            return cls(enabled=False)
+        return cls(log_path=None if value == "1" else value)
+
+    def _memory(self) -> int | None:
+        if self.trace_memory:
+            return tracemalloc.get_traced_memory()[0]
+        return rss_bytes()
+
+    @contextmanager
+    def stage(self, name: str, rows: int | None = None, **labels: Any) -> Iterator[_StageHandle]:
+        handle = _StageHandle(rows)
+        if not self.enabled:
+            yield handle
+            return
+
+        memory_before = self._memory()
+        started = time.perf_counter()
+        try:
+            yield handle
+        finally:
+            seconds = time.perf_counter() - started
+            memory_after = self._memory()
+            delta = memory_after - memory_before if memory_before is not None and memory_after is not None else None
+            self._record(StageRecord(name, seconds, handle.rows, delta, labels))
+
+    def event(self, name: str, **fields: Any) -> None:
+        """Registro pontual (ex.: métricas do modelo, limiares de severidade)"""
+        if self.enabled:
+            self._write({"event": name, **fields})
+
+    def _record(self, record: StageRecord) -> None:
+        with self._lock:
+            self.records.append(record)
+            stage = self._totals.setdefault(record.stage, {"calls": 0, "seconds": 0.0, "rows": 0,
+                                                           "memory_delta_bytes": 0})
+            stage["calls"] += 1
+            stage["seconds"] += record.seconds
+            stage["rows"] += record.rows or 0
+            stage["memory_delta_bytes"] += record.memory_delta_bytes or 0
+        self._write({"event": "stage", **asdict(record)})
+
+    def _write(self, payload: dict) -> None:
+        line = json.dumps(payload, ensure_ascii=False, default=str)
+        if self.log_path is None:
+            logger.info(line)
+            return
+        with self._lock, open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """Totais por estágio: chamadas, segundos, linhas e variação de memória"""
+        with self._lock:
+            return {stage: dict(totals) for stage, totals in self._totals.items()}
+
+    def write_json(self, out: TextIO) -> int:
+        """Grava os últimos MAX_RECORDS registros como JSON Lines; devolve quantos foram gravados"""
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            out.write(json.dumps(asdict(record), ensure_ascii=False, default=str) + "\n")
+        return len(records)
+
+    def to_prometheus(self) -> str:
+        lines = []
+        metrics = [
+            ("arbo_stage_calls_total", "calls", "counter"),
+            ("arbo_stage_seconds_total", "seconds", "counter"),
+            ("arbo_stage_rows_total", "rows", "counter"),
+            ("arbo_stage_memory_delta_bytes_total", "memory_delta_bytes", "gauge"),
+        ]
+        summary = self.summary()
+        for metric, key, kind in metrics:
+            lines.append(f"# TYPE {metric} {kind}")
+            for stage, totals in sorted(summary.items()):
+                value = totals[key]
+                lines.append(f'{metric}{{stage="{stage}"}} {value:.6f}' if key == "seconds"
+                             else f'{metric}{{stage="{stage}"}} {int(value)}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self.records.clear()
+            self._totals.clear()
@@ -0,0 +1,84 @@
+from dataclasses import dataclass
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# Razão entre a distância q10–q90 e o desvio padrão de uma normal (2 × 1,2816)
+_Q10_Q90_SIGMAS = 2.5631
+
+
+@dataclass(frozen=True)
+class ClimateScenario:
+    """Perturbação do clima futuro: chuva multiplicada, temperatura e umidade somadas"""
+    name: str
+    rainfall_factor: float = 1.0
+    temperature_delta: float = 0.0
+    humidity_delta: float = 0.0
+
+    def apply(self, rainfall: np.ndarray, temperature: np.ndarray,
+              humidity: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return (
+            rainfall * self.rainfall_factor,
+            temperature + self.temperature_delta,
+            np.clip(humidity + self.humidity_delta, 0, 100),
+        )
+
+
+BASELINE = ClimateScenario("baseline")
+
+
+def median_climate(climate: pd.DataFrame) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Uma única trajetória (1 × meses) com as medianas climatológicas de cada mês alvo"""
+    return tuple(climate[col].to_numpy(dtype=np.float64)[np.newaxis, :]
+                 for col in ("rainfall_mm", "average_temperature", "average_humidity"))
+
+
+def sample_climate(climate: pd.DataFrame, n_draws: int,
+                   seed: int | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sorteia n_draws trajetórias (sorteios × meses) a partir da climatologia do município.
+
+    Cada variável segue uma normal centrada na mediana do mês, com desvio estimado pela
+    distância entre os quantis 10 e 90; chuva e umidade são limitadas à sua faixa válida.
+    """
+    rng = np.random.default_rng(seed)
+    draws = []
+    for col in ("rainfall_mm", "average_temperature", "average_humidity"):
+        median = climate[col].to_numpy(dtype=np.float64)
+        sigma = (climate[f"{col}_q90"].to_numpy(dtype=np.float64)
+                 - climate[f"{col}_q10"].to_numpy(dtype=np.float64)) / _Q10_Q90_SIGMAS
+        draws.append(median + rng.standard_normal((n_draws, len(median))) * sigma)
+    rainfall, temperature, humidity = draws
+    return np.maximum(rainfall, 0), temperature, np.clip(humidity, 0, 100)
+
+
+def apply_scenarios(scenarios: list[ClimateScenario], rainfall: np.ndarray, temperature: np.ndarray,
+                    humidity: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Aplica cada cenário a todas as trajetórias: (sorteios × meses) -> (cenários × sorteios × meses)"""
+    applied = [scenario.apply(rainfall, temperature, humidity) for scenario in scenarios]
+    return tuple(np.stack([values[i] for values in applied]) for i in range(3))
+
+
+if __name__ == "__main__":
+    from predictor import Predictor
+
+    parser = argparse.ArgumentParser(description="Previsão de casos sob cenários climáticos")
+    parser.add_argument("city_code")
+    parser.add_argument("--table", default=os.path.join(os.path.dirname(__file__), '..', 'data', 'master_table.csv'))
+    parser.add_argument("--start", required=True, help="Mês inicial no formato AAAA-MM")
+    parser.add_argument("--months", type=int, default=3)
+    parser.add_argument("--rainfall-factor", type=float, default=1.0, help="Ex.: 1.3 = 30%% mais chuva")
+    parser.add_argument("--temperature-delta", type=float, default=0.0, help="Variação em °C")
+    parser.add_argument("--humidity-delta", type=float, default=0.0, help="Variação em pontos percentuais")
+    parser.add_argument("--draws", type=int, default=0, help="Trajetórias climáticas sorteadas (0 = medianas)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    scenario = ClimateScenario("what_if", args.rainfall_factor, args.temperature_delta, args.humidity_delta)
+    start = tuple(int(value) for value in args.start.split("-"))
+    result = Predictor(args.table).predict_scenarios(
+        args.city_code, start, args.months, [BASELINE, scenario], n_draws=args.draws, seed=args.seed
+    )
+    print(result.to_string(index=False))
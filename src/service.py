@@ -0,0 +1,299 @@
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import argparse
+import io
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from alerts import Alert, write_cap_feed
+from forecast_store import ForecastStore
+from predictor import IBGE_CITY_CODES, Predictor
+
+
+# Limites de latência (segundos) do histograma exportado em /metrics
+LATENCY_BUCKETS: tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Horizonte máximo aceito por requisição (meses)
+MAX_HORIZON = 24
+
+# Meses iniciais aceitos: até START_WINDOW meses antes ou depois do próximo mês. Cada
+# combinação distinta vira uma entrada em memória e um arquivo em forecasts/
+START_WINDOW = 12
+
+# Previsões mantidas em memória (as menos usadas recentemente saem primeiro)
+MAX_CACHE_ENTRIES = 4096
+
+
+def next_month() -> tuple[int, int]:
+    today = datetime.now()
+    return (today.year + 1, 1) if today.month == 12 else (today.year, today.month + 1)
+
+
+class ServiceMetrics:
+    """Contadores e histograma de latência por rota, no formato de texto do Prometheus"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests: dict[tuple[str, int], int] = {}
+        self.buckets: dict[str, list[int]] = {}
+        self.latency_sum: dict[str, float] = {}
+        self.recent: dict[str, deque] = {}
+        self.counters: dict[str, int] = {"cache_hits": 0, "cache_misses": 0, "coalesced": 0, "computations": 0,
+                                         "feed_errors": 0}
+
+    def observe(self, route: str, status: int, seconds: float) -> None:
+        with self._lock:
+            self.requests[(route, status)] = self.requests.get((route, status), 0) + 1
+            counts = self.buckets.setdefault(route, [0] * len(LATENCY_BUCKETS))
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    counts[i] += 1
+            self.latency_sum[route] = self.latency_sum.get(route, 0.0) + seconds
+            self.recent.setdefault(route, deque(maxlen=1000)).append(seconds)
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def render(self) -> str:
+        with self._lock:
+            lines = ["# TYPE arbo_requests_total counter"]
+            for (route, status), value in sorted(self.requests.items()):
+                lines.append(f'arbo_requests_total{{route="{route}",status="{status}"}} {value}')
+
+            lines.append("# TYPE arbo_request_duration_seconds histogram")
+            for route, counts in sorted(self.buckets.items()):
+                total = sum(value for (r, _), value in self.requests.items() if r == route)
+                for bound, value in zip(LATENCY_BUCKETS, counts):
+                    lines.append(f'arbo_request_duration_seconds_bucket{{route="{route}",le="{bound}"}} {value}')
+                lines.append(f'arbo_request_duration_seconds_bucket{{route="{route}",le="+Inf"}} {total}')
+                lines.append(f'arbo_request_duration_seconds_sum{{route="{route}"}} {self.latency_sum[route]:.6f}')
+                lines.append(f'arbo_request_duration_seconds_count{{route="{route}"}} {total}')
+
+            # Percentis das últimas 1000 requisições de cada rota
+            lines.append("# TYPE arbo_request_duration_recent_seconds gauge")
+            for route, recent in sorted(self.recent.items()):
+                ordered = sorted(recent)
+                for q in (0.5, 0.95, 0.99):
+                    value = ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+                    lines.append(f'arbo_request_duration_recent_seconds{{route="{route}",quantile="{q}"}} {value:.6f}')
+
+            for name, value in self.counters.items():
+                lines.append(f"# TYPE arbo_forecast_{name}_total counter")
+                lines.append(f"arbo_forecast_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+
+class ForecastService:
+    """Previsões servidas a partir de modelos e dados mantidos em memória.
+
+    Resultados ficam em cache (LRU, até MAX_CACHE_ENTRIES) pela versão dos dados/parâmetros
+    do município (a mesma do ForecastStore), e requisições simultâneas do mesmo município,
+    mês e horizonte aguardam um único cálculo em vez de treinar/prever várias vezes. Os
+    cálculos em si são serializados, para que treinos simultâneos não disputem CPU e memória.
+    """
+
+    def __init__(self, tablepath: str, model_dir: str | None = None, store_dir: str | None = None) -> None:
+        self.store = ForecastStore(Predictor(tablepath, model_dir=model_dir), store_dir)
+        self.metrics = ServiceMetrics()
+        self._cache: OrderedDict[tuple, tuple[pd.DataFrame, list[Alert]]] = OrderedDict()
+        self._inflight: dict[tuple, Future] = {}
+        self._lock = threading.Lock()
+        self._compute_lock = threading.Lock()
+
+    @property
+    def city_codes(self) -> list[str]:
+        return [str(code) for code in self.store.predictor.dataset.city_codes]
+
+    def forecast(self, city_code: str, start: tuple, horizon: int) -> tuple[pd.DataFrame, list[Alert]]:
+        key = (city_code, start, horizon, self.store.version(city_code))
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.metrics.count("cache_hits")
+                return cached
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.metrics.count("cache_misses")
+            else:
+                self.metrics.count("coalesced")
+
+        if not owner:
+            return future.result()
+
+        try:
+            with self._compute_lock:
+                self.metrics.count("computations")
+                result = self.store.get_or_compute(city_code, start, horizon)
+            with self._lock:
+                # Versões antigas do mesmo município deixam de ser servidas
+                for stale in [k for k in self._cache if k[:3] == key[:3]]:
+                    del self._cache[stale]
+                self._cache[key] = result
+                while len(self._cache) > MAX_CACHE_ENTRIES:
+                    self._cache.popitem(last=False)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def warm(self, city_codes: list[str], start: tuple, horizon: int) -> None:
+        for city_code in city_codes:
+            try:
+                self.forecast(city_code, start, horizon)
+            except ValueError:
+                pass
+
+
+def _parse_start(value: str | None) -> tuple[int, int]:
+    if not value:
+        return next_month()
+    year, month = (int(part) for part in value.split("-"))
+    if not 1 <= month <= 12:
+        raise ValueError("start month must be between 1 and 12")
+    next_year, next_month_ = next_month()
+    if abs((year - next_year) * 12 + month - next_month_) > START_WINDOW:
+        raise ValueError(f"start must be within {START_WINDOW} months of {next_year}-{next_month_:02d}")
+    return year, month
+
+
+def _parse_horizon(value: str | None) -> int:
+    horizon = int(value or 1)
+    if not 1 <= horizon <= MAX_HORIZON:
+        raise ValueError(f"horizon must be between 1 and {MAX_HORIZON}")
+    return horizon
+
+
+class ForecastRequestHandler(BaseHTTPRequestHandler):
+    service: ForecastService
+
+    def do_GET(self) -> None:
+        started = time.perf_counter()
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        route = url.path if url.path in ("/forecast", "/alerts.cap", "/metrics", "/health") else "other"
+        try:
+            if url.path == "/forecast":
+                status = self._forecast(query)
+            elif url.path == "/alerts.cap":
+                status = self._alerts_cap(query)
+            elif url.path == "/metrics":
+                # Inclui os tempos por estágio do pipeline quando a instrumentação está ativa
+                profiler = self.service.store.predictor.profiler
+                body = self.service.metrics.render() + (profiler.to_prometheus() if profiler.enabled else "")
+                status = self._send(200, body, "text/plain; version=0.0.4")
+            elif url.path == "/health":
+                status = self._send_json(200, {"status": "ok"})
+            else:
+                status = self._send_json(404, {"error": f"Unknown path: {url.path}"})
+        except ValueError as e:
+            status = self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            status = self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+        self.service.metrics.observe(route, status, time.perf_counter() - started)
+
+    def _forecast(self, query: dict) -> int:
+        city_code = query.get("city", [""])[0]
+        if not city_code:
+            raise ValueError("Missing 'city' parameter")
+        start = _parse_start(query.get("start", [None])[0])
+        horizon = _parse_horizon(query.get("horizon", [None])[0])
+
+        forecast, alerts = self.service.forecast(city_code, start, horizon)
+        return self._send_json(200, {
+            "city_code": city_code,
+            "start": f"{start[0]}-{start[1]:02d}",
+            "horizon": horizon,
+            "forecast": forecast.to_dict(orient="records"),
+            "alerts": [alert.to_dict() for alert in alerts],
+        })
+
+    def _alerts_cap(self, query: dict) -> int:
+        # city pode ser repetido ou separado por vírgulas; sem city, todos os municípios
+        codes = [code for value in query.get("city", []) for code in value.split(",") if code]
+        start = _parse_start(query.get("start", [None])[0])
+        horizon = _parse_horizon(query.get("horizon", [None])[0])
+
+        # Um município que falha não derruba o feed: ele é pulado e listado em um comentário
+        # ao final do documento, e os demais seguem sendo enviados à medida que ficam prontos
+        skipped: list[tuple[str, str]] = []
+
+        def alerts():
+            for city_code in codes or self.service.city_codes:
+                try:
+                    city_alerts = self.service.forecast(city_code, start, horizon)[1]
+                except Exception as e:
+                    self.service.metrics.count("feed_errors")
+                    skipped.append((city_code, type(e).__name__))
+                    continue
+                yield from city_alerts
+
+        # Sem Content-Length: o corpo vai em streaming e a conexão é fechada ao final (HTTP/1.0)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/xml; charset=utf-8")
+        self.end_headers()
+        out = io.TextIOWrapper(self.wfile, encoding="utf-8", write_through=True)
+        try:
+            write_cap_feed(alerts(), out)
+            for city_code, error in skipped:
+                out.write(f"<!-- skipped {city_code}: {error} -->\n")
+        finally:
+            out.detach()
+        return 200
+
+    def _send_json(self, status: int, payload: dict) -> int:
+        return self._send(status, json.dumps(payload, ensure_ascii=False, default=str), "application/json; charset=utf-8")
+
+    def _send(self, status: int, body: str, content_type: str) -> int:
+        encoded = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+        return status
+
+    def log_message(self, format: str, *args) -> None:
+        # As requisições são contabilizadas em /metrics; sem log por requisição no stderr
+        pass
+
+
+def make_server(service: ForecastService, host: str = "127.0.0.1", port: int = 8080) -> ThreadingHTTPServer:
+    handler = type("Handler", (ForecastRequestHandler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serviço HTTP local de previsões e alertas CAP")
+    parser.add_argument("--table", default=os.path.join(os.path.dirname(__file__), '..', 'data', 'master_table.csv'))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--warm", action="store_true",
+                        help="Carrega/treina os modelos de IBGE_CITY_CODES antes de aceitar requisições")
+    parser.add_argument("--warm-all", action="store_true", help="Como --warm, para todos os municípios da tabela")
+    args = parser.parse_args()
+
+    forecast_service = ForecastService(args.table)
+    if args.warm or args.warm_all:
+        forecast_service.warm(forecast_service.city_codes if args.warm_all else list(IBGE_CITY_CODES), next_month(), 1)
+
+    server = make_server(forecast_service, args.host, args.port)
+    print(f"Servindo em http://{args.host}:{args.port} (/forecast, /alerts.cap, /metrics)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
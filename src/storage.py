@@ -0,0 +1,168 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+
+# Extensão do formato colunar binário (um diretório com um .npy por coluna + schema.json)
+STORE_SUFFIX = ".npystore"
+SCHEMA_FILE = "schema.json"
+SCHEMA_VERSION = 1
+
+# Esquema da tabela mestre, na ordem canônica das colunas
+SCHEMA: dict[str, str] = {
+    "id": "int32",
+    "year": "int16",
+    "month": "int16",
+    "municipality_code_ibge": "int32",
+    "municipality_name": "category",
+    "dengue_cases": "int32",
+    "estimated_population": "int32",
+    "rainfall_mm": "float32",
+    "average_temperature": "float32",
+    "average_humidity": "float32",
+}
+
+# Colunas presentes apenas em algumas tabelas (ex.: ghost_table_v1_old.csv). Em float32, e não
+# int32, porque podem faltar em parte dos meses (ex.: zika antes da notificação compulsória): um
+# NaN nessas colunas não pode impedir a carga da tabela inteira
+OPTIONAL_SCHEMA: dict[str, str] = {
+    "chikungunya_cases": "float32",
+    "zika_cases": "float32",
+    "total_cases": "float32",
+}
+
+
+def is_store(path: str) -> bool:
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, SCHEMA_FILE))
+
+
+def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Valida o esquema, reordena as colunas na ordem canônica e aplica os tipos compactos"""
+    missing = [col for col in SCHEMA if col not in df.columns]
+    if missing:
+        raise ValueError(f"Table is missing required columns: {', '.join(missing)}")
+
+    optional = [col for col in OPTIONAL_SCHEMA if col in df.columns]
+    df = df[list(SCHEMA) + optional]
+    return df.astype({**SCHEMA, **{col: OPTIONAL_SCHEMA[col] for col in optional}})
+
+
+def read_csv_table(path: str) -> pd.DataFrame:
+    # utf-8-sig: a master_table.csv é salva com BOM
+    return normalize_columns(pd.read_csv(path, sep=";", encoding="utf-8-sig"))
+
+
+def read_store(path: str, columns: list[str] | None = None, mmap: bool = True,
+               rows: slice | np.ndarray | None = None) -> pd.DataFrame:
+    """Lê o formato colunar sem parsing de texto (as colunas numéricas são mapeadas em memória).
+
+    rows (fatia ou índices) lê só essas linhas do disco, sem materializar as colunas inteiras.
+    """
+    schema = read_schema(path)
+    columns = columns or list(schema["columns"])
+    data = {}
+    for col in columns:
+        if col not in schema["columns"]:
+            raise ValueError(f"Column not found in store: {col}")
+        values = np.load(os.path.join(path, f"{col}.npy"), mmap_mode="r" if mmap or rows is not None else None)
+        if rows is not None:
+            values = np.asarray(values[rows])
+        if schema["columns"][col] == "category":
+            data[col] = pd.Categorical(values.astype(str))
+        else:
+            data[col] = values
+    return pd.DataFrame(data, columns=columns)
+
+
+def store_is_current(store_path: str, csv_path: str) -> bool:
+    """O store existe e foi gravado depois da última alteração do CSV de origem (ou o CSV não existe)"""
+    if not is_store(store_path):
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    return os.path.getmtime(os.path.join(store_path, SCHEMA_FILE)) >= os.path.getmtime(csv_path)
+
+
+def read_schema(path: str) -> dict:
+    with open(os.path.join(path, SCHEMA_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def read_table(path: str, columns: list[str] | None = None) -> pd.DataFrame:
+    """Lê a tabela mestre a partir do formato colunar ou de um CSV (caminho de importação)"""
+    if is_store(path):
+        return read_store(path, columns)
+
+    df = read_csv_table(path)
+    return df[columns] if columns else df
+
+
+def write_store(df: pd.DataFrame, path: str) -> str:
+    """Grava a tabela no formato colunar, ordenada por (município, ano, mês)"""
+    df = normalize_columns(df)
+    df = df.sort_values(["municipality_code_ibge", "year", "month"], kind="stable").reset_index(drop=True)
+
+    # Grava em um diretório temporário e troca no final, para nunca expor um store incompleto
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    digest = hashlib.sha1()
+    columns: dict[str, str] = {}
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            values = df[col].astype(str).to_numpy(dtype=str)
+            columns[col] = "category"
+        else:
+            values = df[col].to_numpy()
+            columns[col] = str(values.dtype)
+        np.save(os.path.join(tmp_path, f"{col}.npy"), values)
+        digest.update(col.encode("utf-8"))
+        digest.update(np.ascontiguousarray(values).tobytes())
+
+    schema = {
+        "schema_version": SCHEMA_VERSION,
+        "rows": len(df),
+        "columns": columns,
+        "fingerprint": digest.hexdigest(),
+    }
+    with open(os.path.join(tmp_path, SCHEMA_FILE), "w", encoding="utf-8") as f:
+        json.dump(schema, f, indent=2)
+
+    if os.path.exists(path):
+        old_path = f"{path}.{os.getpid()}.old"
+        os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+    else:
+        os.replace(tmp_path, path)
+    return path
+
+
+def csv_to_store(csv_path: str, store_path: str | None = None) -> str:
+    store_path = store_path or os.path.splitext(csv_path)[0] + STORE_SUFFIX
+    return write_store(read_csv_table(csv_path), store_path)
+
+
+def store_to_csv(store_path: str, csv_path: str) -> str:
+    df = read_store(store_path, mmap=False)
+    # Mesmo formato da master_table.csv: separador ';' e BOM UTF-8
+    df.to_csv(csv_path, sep=";", index=False, encoding="utf-8-sig")
+    return csv_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Conversão entre CSV e o formato colunar binário")
+    parser.add_argument("source", help="Arquivo .csv (importação) ou diretório .npystore (exportação)")
+    parser.add_argument("target", nargs="?", default=None)
+    args = parser.parse_args()
+
+    if is_store(args.source):
+        print(store_to_csv(args.source, args.target or os.path.splitext(args.source)[0] + ".csv"))
+    else:
+        print(csv_to_store(args.source, args.target))
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+from forecast_store import ForecastStore
+
+
+GROUP_COL = "municipality_code_ibge"
+
+# Períodos aceitos na redução das séries (meses por ponto)
+DOWNSAMPLE_MONTHS: dict[str, int] = {"month": 1, "quarter": 3, "year": 12}
+
+
+def latest_observed(table: pd.DataFrame) -> pd.DataFrame:
+    """Último mês observado de cada município, com a incidência por 100 mil habitantes"""
+    latest = table.sort_values([GROUP_COL, "year", "month"], kind="stable").drop_duplicates(GROUP_COL, keep="last")
+    latest = latest[[GROUP_COL, "municipality_name", "year", "month", "dengue_cases", "estimated_population"]]
+    latest = latest.rename(columns={"year": "last_year", "month": "last_month", "dengue_cases": "last_cases"})
+    latest["uf_code"] = latest[GROUP_COL] // 100000
+    latest["incidence_100k"] = latest["last_cases"] / latest["estimated_population"] * 100000
+    return latest.reset_index(drop=True)
+
+
+def forecast_summary(table: pd.DataFrame, store: ForecastStore, start: tuple, n_months: int) -> pd.DataFrame:
+    """Uma linha por município: último mês observado e a previsão do primeiro mês do horizonte.
+
+    Lê apenas o que já está no store; municípios ainda não calculados ficam com a previsão
+    vazia (status "pendente") em vez de disparar treinos.
+    """
+    summary = latest_observed(table)
+    predicted = np.full(len(summary), np.nan)
+    prob_severe = np.full(len(summary), np.nan)
+    severity = np.full(len(summary), None, dtype=object)
+
+    for i, code in enumerate(summary[GROUP_COL].astype(str)):
+        stored = store.get(code, start, n_months)
+        if stored is None:
+            continue
+        forecast = stored[0].iloc[0]
+        predicted[i] = forecast["predicted_cases"]
+        prob_severe[i] = forecast["prob_severe"]
+        severity[i] = forecast["severity"]
+
+    summary["predicted_cases"] = predicted
+    summary["predicted_incidence_100k"] = predicted / summary["estimated_population"] * 100000
+    summary["severity"] = severity
+    summary["prob_severe"] = prob_severe
+    summary["status"] = np.where(np.isnan(predicted), "pendente", "pronto")
+    return summary
+
+
+def downsample_series(table: pd.DataFrame, period: str = "quarter", city_codes: list[int] | None = None,
+                      by: str = GROUP_COL) -> pd.DataFrame:
+    """Casos somados por período (mês, trimestre ou ano) para cada município ou UF.
+
+    Reduz o número de pontos dos gráficos: com centenas de municípios, uma série
+    trimestral tem um terço dos pontos da mensal. by="uf_code" agrega por UF.
+    """
+    if period not in DOWNSAMPLE_MONTHS:
+        raise ValueError(f"Unknown period: {period}. Use one of {', '.join(DOWNSAMPLE_MONTHS)}.")
+
+    df = table if city_codes is None else table[table[GROUP_COL].isin(city_codes)]
+    step = DOWNSAMPLE_MONTHS[period]
+    keys = pd.DataFrame({
+        by: df[GROUP_COL] // 100000 if by == "uf_code" else df[GROUP_COL],
+        "year": df["year"],
+        # Primeiro mês do período (1, 4, 7, 10 para trimestres)
+        "month": (df["month"] - 1) // step * step + 1,
+    })
+    series = df["dengue_cases"].groupby([keys[by], keys["year"], keys["month"]]).sum().reset_index()
+    series["period"] = pd.to_datetime(series[["year", "month"]].assign(day=1))
+    return series[[by, "period", "dengue_cases"]]
@@ -0,0 +1,200 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (habilita HalvingGridSearchCV)
+from sklearn.model_selection import HalvingGridSearchCV, TimeSeriesSplit, cross_val_score
+
+from dataset import get_dataset
+from features import DEFAULT_DISEASE, DISEASES, disease_view
+from forecast_engine import limit_worker_threads, pool_size
+from model_registry import ModelRegistry
+from predictor import FEATURE_COLS, IBGE_CITY_CODES, RF_PARAMS, Predictor
+
+
+# Espaço de busca; n_estimators é o recurso do successive halving, não faz parte da grade
+PARAM_GRID: dict[str, list] = {
+    "max_depth": [8, 20, None],
+    "min_samples_split": [2, 3, 6],
+    "min_samples_leaf": [1, 2, 4],
+    "max_features": ["sqrt", 0.5, 1.0],
+}
+
+# Agrupamentos possíveis: um ajuste por município ou um por UF (municípios da UF juntos)
+CLUSTER_MODES: tuple[str, ...] = ("city", "uf")
+
+# Granularidade do número de árvores após a poda
+TREE_STEP = 25
+
+
+@dataclass
+class TuningResult:
+    name: str
+    city_codes: list[str]
+    params: dict = field(default_factory=dict)
+    cv_mae: float = float("nan")
+    default_cv_mae: float = float("nan")
+    n_rows: int = 0
+    error: str | None = None
+
+
+def _prune_trees(X: np.ndarray, y: np.ndarray, params: dict, cv: TimeSeriesSplit, tolerance: float) -> int:
+    """Menor número de árvores (múltiplo de TREE_STEP) cujo MAE de validação fica a até
+    'tolerance' do MAE da floresta completa.
+
+    Uma floresta com as primeiras k árvores é só a média das k primeiras previsões, então
+    uma única floresta por fold avalia todos os tamanhos de uma vez.
+    """
+    max_trees = params["n_estimators"]
+    errors = np.zeros(max_trees)
+    for train_idx, test_idx in cv.split(X):
+        model = RandomForestRegressor(**params, n_jobs=1).fit(X[train_idx], y[train_idx])
+        X_test = np.ascontiguousarray(X[test_idx], dtype=np.float32)
+        tree_preds = np.stack([tree.predict(X_test, check_input=False) for tree in model.estimators_])
+        running_mean = np.cumsum(tree_preds, axis=0) / np.arange(1, max_trees + 1)[:, None]
+        errors += np.abs(running_mean - y[test_idx]).mean(axis=1)
+
+    candidates = np.arange(TREE_STEP, max_trees + 1, TREE_STEP)
+    good = candidates[errors[candidates - 1] <= errors[-1] * (1 + tolerance)]
+    return int(good[0]) if len(good) else max_trees
+
+
+def tune(df: pd.DataFrame, name: str, city_codes: list[str], param_grid: dict = PARAM_GRID,
+         n_splits: int = 4, factor: int = 3, tolerance: float = 0.01, n_jobs: int = -1) -> TuningResult:
+    """Busca os hiperparâmetros do Random Forest com validação cruzada temporal.
+
+    Os candidatos da grade disputam rodadas de successive halving em que o recurso é o
+    número de árvores (poucas árvores para todos, mais árvores só para os melhores). O
+    vencedor tem então a floresta podada para o menor tamanho que não piora o MAE.
+    Sem StandardScaler: as árvores não dependem da escala das features.
+    """
+    # Colunas de outras doenças (ex.: zika ausente nos primeiros anos) não descartam linhas
+    df = df.dropna(subset=FEATURE_COLS + ["target"])
+    # Vários municípios (cluster): ordem do calendário para que os folds respeitem o tempo
+    df = df.sort_values(["year", "month"], kind="stable")
+    X = df[FEATURE_COLS].to_numpy(dtype=np.float32)
+    y = df["target"].to_numpy(dtype=np.float64)
+    cv = TimeSeriesSplit(n_splits=n_splits)
+
+    base_params = {k: v for k, v in RF_PARAMS.items() if k != "n_estimators"}
+    search = HalvingGridSearchCV(
+        RandomForestRegressor(**base_params),
+        param_grid,
+        cv=cv,
+        resource="n_estimators",
+        max_resources=RF_PARAMS["n_estimators"],
+        min_resources="exhaust",
+        factor=factor,
+        scoring="neg_mean_absolute_error",
+        refit=False,
+        n_jobs=n_jobs,
+    ).fit(X, y)
+
+    best = {**RF_PARAMS, **search.best_params_, "n_estimators": RF_PARAMS["n_estimators"]}
+    best["n_estimators"] = _prune_trees(X, y, best, cv, tolerance)
+    cv_mae = -cross_val_score(RandomForestRegressor(**best, n_jobs=n_jobs), X, y, cv=cv,
+                              scoring="neg_mean_absolute_error").mean()
+    default_cv_mae = -cross_val_score(RandomForestRegressor(**RF_PARAMS, n_jobs=n_jobs), X, y, cv=cv,
+                                      scoring="neg_mean_absolute_error").mean()
+
+    # Só troca os parâmetros padrão quando o ajuste é de fato melhor
+    if default_cv_mae < cv_mae:
+        best, cv_mae = dict(RF_PARAMS), default_cv_mae
+
+    return TuningResult(name=name, city_codes=city_codes, params=best, cv_mae=float(cv_mae),
+                        default_cv_mae=float(default_cv_mae), n_rows=len(df))
+
+
+# Dataset de cada processo do pool
+_WORKER_TABLEPATH: str | None = None
+
+
+def _init_worker(tablepath: str, threads_per_worker: int) -> None:
+    global _WORKER_TABLEPATH
+    limit_worker_threads(threads_per_worker)
+    _WORKER_TABLEPATH = tablepath
+
+
+def _tune_worker(name: str, city_codes: list[str], n_splits: int, tolerance: float, n_jobs: int,
+                 disease: str = DEFAULT_DISEASE) -> TuningResult:
+    try:
+        dataset = get_dataset(_WORKER_TABLEPATH)
+        df = pd.concat([disease_view(dataset.city_features(code), disease) for code in city_codes],
+                       ignore_index=True)
+        return tune(df, name, city_codes, n_splits=n_splits, tolerance=tolerance, n_jobs=n_jobs)
+    except Exception as e:
+        return TuningResult(name=name, city_codes=city_codes, error=f"{type(e).__name__}: {e}")
+
+
+def _clusters(city_codes: list[str], cluster: str) -> dict[str, list[str]]:
+    if cluster == "city":
+        return {code: [code] for code in city_codes}
+    groups: dict[str, list[str]] = {}
+    for code in city_codes:
+        groups.setdefault(f"uf{int(code) // 100000}", []).append(code)
+    return groups
+
+
+def tune_all(tablepath: str, city_codes: list[str] | None = None, cluster: str = "city",
+             n_splits: int = 4, tolerance: float = 0.01, max_workers: int | None = None,
+             model_dir: str | None = None, disease: str = DEFAULT_DISEASE) -> list[TuningResult]:
+    """Ajusta os hiperparâmetros por município ou por UF, em paralelo, e salva os vencedores
+    no cache de modelos. O Predictor passa a treinar cada município com os seus parâmetros.
+
+    Os parâmetros valem só para a doença ajustada: ficam sob o nome do modelo dela
+    (ex.: '3106200' para dengue, '3106200_zika' para zika).
+    """
+    if cluster not in CLUSTER_MODES:
+        raise ValueError(f"Unknown cluster mode: {cluster}. Use one of {', '.join(CLUSTER_MODES)}.")
+    if city_codes is None:
+        city_codes = [str(code) for code in get_dataset(tablepath).city_codes]
+    groups = _clusters(city_codes, cluster)
+
+    max_workers, threads_per_worker = pool_size(len(groups), max_workers)
+
+    registry = ModelRegistry(model_dir)
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(tablepath, threads_per_worker)
+    ) as executor:
+        futures = [
+            executor.submit(_tune_worker, name, codes, n_splits, tolerance, threads_per_worker, disease)
+            for name, codes in groups.items()
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            if result.error is None:
+                for code in result.city_codes:
+                    registry.put_params(Predictor._model_name(code, disease), result.params,
+                                        cluster=result.name, cv_mae=result.cv_mae,
+                                        default_cv_mae=result.default_cv_mae)
+            results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ajuste de hiperparâmetros do Random Forest por município")
+    parser.add_argument("--table", default=os.path.join(os.path.dirname(__file__), '..', 'data', 'master_table.csv'))
+    parser.add_argument("--all", action="store_true", help="Todos os municípios da tabela (padrão: IBGE_CITY_CODES)")
+    parser.add_argument("--cluster", choices=CLUSTER_MODES, default="city",
+                        help="Um ajuste por município ou um por UF")
+    parser.add_argument("--splits", type=int, default=4, help="Folds da validação cruzada temporal")
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="Piora relativa de MAE aceita ao podar o número de árvores")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--disease", choices=list(DISEASES), default=DEFAULT_DISEASE)
+    args = parser.parse_args()
+
+    for result in tune_all(args.table, city_codes=None if args.all else list(IBGE_CITY_CODES),
+                           cluster=args.cluster, n_splits=args.splits, tolerance=args.tolerance,
+                           max_workers=args.workers, disease=args.disease):
+        if result.error is not None:
+            print(f"{result.name}: {result.error}")
+            continue
+        print(f"{result.name}: MAE={result.cv_mae:.1f} (padrão {result.default_cv_mae:.1f}) | {result.params}")
@@ -0,0 +1,275 @@
+from dataclasses import dataclass, field
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from storage import OPTIONAL_SCHEMA, SCHEMA, is_store, normalize_columns, read_store, write_store
+
+
+KEY_COLS: list[str] = ["municipality_code_ibge", "year", "month"]
+COUNT_COLS: list[str] = ["dengue_cases", "estimated_population"]
+
+# Faixas plausíveis das médias/totais mensais; valores fora delas são tratados como ausentes
+CLIMATE_RANGES: dict[str, tuple[float, float]] = {
+    "rainfall_mm": (0.0, 1500.0),
+    "average_temperature": (-5.0, 40.0),
+    "average_humidity": (0.0, 100.0),
+}
+
+
+@dataclass
+class ValidationReport:
+    """Resultado da validação: contagens por verificação e uma linha por problema encontrado"""
+    rows: int = 0
+    municipalities: int = 0
+    duplicated_keys: int = 0
+    missing_months: int = 0
+    invalid_months: int = 0
+    null_values: dict[str, int] = field(default_factory=dict)
+    negative_counts: dict[str, int] = field(default_factory=dict)
+    out_of_range: dict[str, int] = field(default_factory=dict)
+    # Colunas: municipality_code_ibge, year, month, check, column
+    problems: pd.DataFrame = field(default_factory=pd.DataFrame)
+    # Preenchidas pelo repair_table
+    rows_dropped: int = 0
+    rows_inserted: int = 0
+    values_imputed: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.problems.empty
+
+    def summary(self) -> str:
+        parts = [
+            f"{self.rows} linhas, {self.municipalities} municípios",
+            f"chaves duplicadas: {self.duplicated_keys}",
+            f"meses faltantes: {self.missing_months}",
+            f"meses inválidos: {self.invalid_months}",
+        ]
+        for label, counts in (("vazios", self.null_values), ("negativos", self.negative_counts),
+                              ("fora da faixa", self.out_of_range)):
+            parts.append(f"{label}: " + (", ".join(f"{col}={n}" for col, n in counts.items()) or "0"))
+        if self.rows_dropped or self.rows_inserted or self.values_imputed:
+            parts.append(f"reparo: {self.rows_dropped} removidas, {self.rows_inserted} inseridas, "
+                         f"{self.values_imputed} valores imputados")
+        return " | ".join(parts)
+
+
+def _check_schema(df: pd.DataFrame) -> pd.DataFrame:
+    # Tabelas antigas têm outra ordem de colunas: reordena sem converter tipos (ainda pode haver NaN)
+    missing = [col for col in SCHEMA if col not in df.columns]
+    if missing:
+        raise ValueError(f"Table is missing required columns: {', '.join(missing)}")
+    extra = [col for col in df.columns if col not in SCHEMA]
+    return df[list(SCHEMA) + extra]
+
+
+def _count_cols(df: pd.DataFrame) -> list[str]:
+    # Contagens obrigatórias e as de outras arboviroses presentes na tabela (ex.: zika_cases)
+    return COUNT_COLS + [col for col in OPTIONAL_SCHEMA if col in df.columns]
+
+
+def _problem_rows(df: pd.DataFrame, mask: np.ndarray, check: str, column: str = "") -> pd.DataFrame:
+    rows = df.loc[mask, KEY_COLS].reset_index(drop=True)
+    rows["check"] = check
+    rows["column"] = column
+    return rows
+
+
+def _periods(df: pd.DataFrame) -> np.ndarray:
+    return df["year"].to_numpy(dtype=np.int64) * 12 + df["month"].to_numpy(dtype=np.int64) - 1
+
+
+def _missing_months(codes: np.ndarray, periods: np.ndarray) -> pd.DataFrame:
+    """Meses ausentes entre o primeiro e o último mês de cada município (tabela ordenada, sem duplicatas)"""
+    if len(codes) < 2:
+        return pd.DataFrame({col: pd.Series(dtype=np.int64) for col in KEY_COLS})
+    same_city = codes[1:] == codes[:-1]
+    gaps = np.where(same_city, periods[1:] - periods[:-1] - 1, 0)
+    gap_at = np.flatnonzero(gaps > 0)
+    sizes = gaps[gap_at]
+    # Para cada lacuna, os meses seguintes ao último mês presente
+    missing = np.repeat(periods[gap_at], sizes) + 1 + (
+        np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    )
+    return pd.DataFrame({
+        "municipality_code_ibge": np.repeat(codes[gap_at], sizes),
+        "year": missing // 12,
+        "month": missing % 12 + 1,
+    })
+
+
+def validate_table(df: pd.DataFrame) -> ValidationReport:
+    """Verifica esquema, chaves duplicadas, meses faltantes, contagens negativas e clima fora da faixa.
+
+    Todas as verificações são máscaras vetorizadas sobre a tabela inteira, sem laço por município.
+    """
+    df = _check_schema(df).sort_values(KEY_COLS, kind="stable").reset_index(drop=True)
+    report = ValidationReport(rows=len(df), municipalities=int(df["municipality_code_ibge"].nunique()))
+    problems = []
+
+    null_mask = df[list(SCHEMA) + [col for col in OPTIONAL_SCHEMA if col in df.columns]].isna()
+    for col, count in null_mask.sum().items():
+        if count:
+            report.null_values[col] = int(count)
+            problems.append(_problem_rows(df, null_mask[col].to_numpy(), "null", col))
+
+    months = df["month"].to_numpy(dtype=np.float64)
+    invalid_month = ~((months >= 1) & (months <= 12))
+    report.invalid_months = int(invalid_month.sum())
+    if report.invalid_months:
+        problems.append(_problem_rows(df, invalid_month, "invalid_month", "month"))
+
+    for col in _count_cols(df):
+        negative = (df[col] < 0).to_numpy()
+        if negative.any():
+            report.negative_counts[col] = int(negative.sum())
+            problems.append(_problem_rows(df, negative, "negative", col))
+
+    for col, (low, high) in CLIMATE_RANGES.items():
+        values = df[col].to_numpy(dtype=np.float64)
+        outside = (values < low) | (values > high)
+        if outside.any():
+            report.out_of_range[col] = int(outside.sum())
+            problems.append(_problem_rows(df, outside, "out_of_range", col))
+
+    duplicated = df.duplicated(subset=KEY_COLS, keep="last").to_numpy()
+    report.duplicated_keys = int(duplicated.sum())
+    if report.duplicated_keys:
+        problems.append(_problem_rows(df, duplicated, "duplicated_key"))
+
+    # Lacunas no calendário, calculadas sobre as chaves únicas e válidas
+    keys = df.loc[~duplicated & ~invalid_month & df[KEY_COLS].notna().all(axis=1).to_numpy(), KEY_COLS]
+    missing = _missing_months(keys["municipality_code_ibge"].to_numpy(dtype=np.int64), _periods(keys))
+    report.missing_months = len(missing)
+    if len(missing):
+        problems.append(missing.assign(check="missing_month", column=""))
+
+    report.problems = (pd.concat(problems, ignore_index=True) if problems
+                       else pd.DataFrame(columns=KEY_COLS + ["check", "column"]))
+    return report
+
+
+def _interpolate_within_city(values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Interpolação linear dos NaN usando apenas vizinhos do mesmo município (nas pontas, o mais próximo)"""
+    n = len(values)
+    idx = np.arange(n)
+    valid = ~np.isnan(values)
+    prev = np.maximum.accumulate(np.where(valid, idx, -1))
+    nxt = np.minimum.accumulate(np.where(valid, idx, n)[::-1])[::-1]
+    has_prev = (prev >= starts) & ~valid
+    has_next = (nxt < ends) & ~valid
+
+    result = values.copy()
+    both = has_prev & has_next
+    p, q = prev[both], nxt[both]
+    result[both] = values[p] + (values[q] - values[p]) * (idx[both] - p) / (q - p)
+    only_prev = has_prev & ~has_next
+    result[only_prev] = values[prev[only_prev]]
+    only_next = has_next & ~has_prev
+    result[only_next] = values[nxt[only_next]]
+    return result
+
+
+def repair_table(df: pd.DataFrame) -> tuple[pd.DataFrame, ValidationReport]:
+    """Corrige a tabela: remove chaves duplicadas (fica a última ocorrência) e meses inválidos,
+    completa o calendário mensal de cada município e imputa os valores ausentes ou inválidos.
+
+    Clima: mediana do município naquele mês do ano; casos e população (e clima sem histórico do
+    mês): interpolação linear entre os meses vizinhos do mesmo município.
+    """
+    report = validate_table(df)
+    df = _check_schema(df).sort_values(KEY_COLS, kind="stable").reset_index(drop=True)
+
+    keep = ~df.duplicated(subset=KEY_COLS, keep="last") & df["month"].between(1, 12) & df[KEY_COLS].notna().all(axis=1)
+    report.rows_dropped = int((~keep).sum())
+    df = df[keep].reset_index(drop=True)
+
+    # Invalida valores negativos ou fora da faixa, para serem imputados como os ausentes
+    count_cols = _count_cols(df)
+    value_cols = count_cols + list(CLIMATE_RANGES)
+    values = {col: df[col].to_numpy(dtype=np.float64) for col in value_cols}
+    for col in count_cols:
+        values[col] = np.where(values[col] < 0, np.nan, values[col])
+    for col, (low, high) in CLIMATE_RANGES.items():
+        values[col] = np.where((values[col] < low) | (values[col] > high), np.nan, values[col])
+
+    # Calendário completo: cada município do primeiro ao último mês observado
+    codes = df["municipality_code_ibge"].to_numpy(dtype=np.int64)
+    periods = _periods(df)
+    city_start = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(df) else np.array([], dtype=np.int64)
+    city_end = np.r_[city_start[1:], len(df)]
+    first, last = periods[city_start], periods[city_end - 1]
+    lengths = last - first + 1
+    offsets = np.r_[0, np.cumsum(lengths)[:-1]]
+    n = int(lengths.sum())
+
+    city_of_row = np.repeat(np.arange(len(city_start)), lengths)
+    full_periods = np.repeat(first, lengths) + (np.arange(n) - np.repeat(offsets, lengths))
+    position = np.repeat(offsets, city_end - city_start) + (periods - np.repeat(first, city_end - city_start))
+    report.rows_inserted = n - len(df)
+
+    full = {col: np.full(n, np.nan) for col in value_cols}
+    for col in value_cols:
+        full[col][position] = values[col]
+    before = {col: np.isnan(full[col]) for col in value_cols}
+
+    starts, ends = np.repeat(offsets, lengths), np.repeat(offsets + lengths, lengths)
+    month = full_periods % 12 + 1
+    for col in CLIMATE_RANGES:
+        # Mediana do município naquele mês do ano (sazonalidade)
+        seasonal = pd.Series(full[col]).groupby([city_of_row, month]).transform("median").to_numpy()
+        full[col] = np.where(np.isnan(full[col]), seasonal, full[col])
+    for col in value_cols:
+        full[col] = _interpolate_within_city(full[col], starts, ends)
+
+    # As contagens opcionais (outras arboviroses) podem ficar ausentes em municípios sem nenhum registro
+    unfilled = [col for col in COUNT_COLS + list(CLIMATE_RANGES) if np.isnan(full[col]).any()]
+    if unfilled:
+        raise ValueError(f"Cannot impute municipalities with no valid values in: {', '.join(unfilled)}")
+    report.values_imputed = int(sum(before[col].sum() for col in value_cols))
+
+    # Linhas inseridas recebem ids novos e o nome do município
+    ids = np.empty(n, dtype=np.int64)
+    inserted = np.ones(n, dtype=bool)
+    inserted[position] = False
+    ids[position] = df["id"].to_numpy(dtype=np.int64)
+    next_id = int(df["id"].max()) + 1 if len(df) else 1
+    ids[inserted] = np.arange(next_id, next_id + int(inserted.sum()))
+    names = df["municipality_name"].astype(object).to_numpy()[city_start]
+
+    repaired = pd.DataFrame({
+        "id": ids,
+        "year": full_periods // 12,
+        "month": month,
+        "municipality_code_ibge": codes[city_start][city_of_row],
+        "municipality_name": names[city_of_row],
+        **{col: np.rint(full[col]) for col in count_cols},
+        **{col: full[col] for col in CLIMATE_RANGES},
+    })
+    return normalize_columns(repaired), report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Valida (e opcionalmente corrige) a tabela mestre")
+    parser.add_argument("table", help="CSV (separador ';') ou diretório .npystore")
+    parser.add_argument("--repair", default=None, help="Grava a tabela corrigida neste caminho (.csv ou .npystore)")
+    parser.add_argument("--problems", default=None, help="Grava a lista de problemas em CSV")
+    args = parser.parse_args()
+
+    # Sem normalize_columns: a tabela pode ter vazios e outra ordem de colunas
+    raw = read_store(args.table) if is_store(args.table) else pd.read_csv(args.table, sep=";", encoding="utf-8-sig")
+    if args.repair:
+        table, result = repair_table(raw)
+        if args.repair.endswith(".csv"):
+            table.to_csv(args.repair, sep=";", index=False, encoding="utf-8-sig")
+        else:
+            write_store(table, args.repair)
+    else:
+        result = validate_table(raw)
+    if args.problems:
+        result.problems.to_csv(args.problems, sep=";", index=False)
+    print(result.summary())
+    if args.repair is None and not result.ok:
+        raise SystemExit(1)